@@ -28,34 +28,38 @@ def fetch_code_scanning_alerts(org_name, token, output_file):
         'Accept': 'application/vnd.github.v3+json'
     }
 
-    all_alerts = []
-    url = f'https://api.github.com/orgs/{org_name}/code-scanning/alerts'
-    while url:
-        print(f"Fetching {url}")
-        response = requests.get(url, headers=headers)
-
-        if response.status_code != 200:
-            print(f"Failed to fetch data: {response.status_code}")
-            break
-
-        alerts = response.json()
-        all_alerts.extend(alerts)
-
-        # Get the next page URL from the Link header
-        if 'link' in response.headers:
-            links = response.headers['link'].split(',')
-            url = None
-            for link in links:
-                if 'rel="next"' in link:
-                    url = link[link.find('<') + 1:link.find('>')]
-                    break
-        else:
-            url = None
-
-    with open(output_file, 'w') as f:
-        json.dump(all_alerts, f, indent=4)
-
-    print(f"Data written to {output_file}")
+    # Each page is written out as it arrives, so only one page of alerts is ever held in memory
+    count = 0
+    with open(output_file, 'w') as output:
+        output.write('[')
+        url = f'https://api.github.com/orgs/{org_name}/code-scanning/alerts'
+        while url:
+            print(f"Fetching {url}")
+            response = requests.get(url, headers=headers)
+
+            if response.status_code != 200:
+                print(f"Failed to fetch data: {response.status_code}")
+                break
+
+            for alert in response.json():
+                output.write(',\n' if count else '\n')
+                output.write(json.dumps(alert, indent=4))
+                count += 1
+
+            # Get the next page URL from the Link header
+            if 'link' in response.headers:
+                links = response.headers['link'].split(',')
+                url = None
+                for link in links:
+                    if 'rel="next"' in link:
+                        url = link[link.find('<') + 1:link.find('>')]
+                        break
+            else:
+                url = None
+
+        output.write('\n]\n')
+
+    print(f"{count} alerts written to {output_file}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,221 @@
+"""
+Measures the peak memory of listing a large organization and reading a large alert export, against a local fake of
+the GitHub API so it runs offline and without spending any rate limit.
+
+    python scripts/memory_benchmark.py --repositories 1000 5000 10000 --alerts 100000
+"""
+import argparse
+import gc
+import json
+import tempfile
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from github import Github
+
+from oss_security_assessments.records import RepositoryRecord, iter_pages
+from oss_security_assessments.util import bounded_map, iter_alert_export
+
+ORGANIZATION = "bench"
+PAGE_SIZE = 100
+
+
+def fake_repository(base_url: str, index: int) -> dict:
+    """A repository shaped like the ones the REST API lists, with the same fields and roughly the same size."""
+    name = f"upstream-{index:06d}__project-{index:06d}"
+    full_name = f"{ORGANIZATION}/{name}"
+    api = f"{base_url}/repos/{full_name}"
+    owner = {
+        "login": ORGANIZATION,
+        "id": 1,
+        "node_id": "O_kgDOBenchmark",
+        "avatar_url": "https://avatars.githubusercontent.com/u/1?v=4",
+        "url": f"{base_url}/users/{ORGANIZATION}",
+        "html_url": f"https://github.com/{ORGANIZATION}",
+        "repos_url": f"{base_url}/users/{ORGANIZATION}/repos",
+        "events_url": f"{base_url}/users/{ORGANIZATION}/events{{/privacy}}",
+        "type": "Organization",
+        "site_admin": False,
+    }
+    repository = {
+        "id": index,
+        "node_id": f"R_kgDOBench{index:08d}",
+        "name": name,
+        "full_name": full_name,
+        "private": False,
+        "owner": owner,
+        "html_url": f"https://github.com/{full_name}",
+        "description": f"A fork of upstream-{index:06d}/project-{index:06d}, for security research purposes.",
+        "fork": True,
+        "url": api,
+        "created_at": "2023-06-01T12:00:00Z",
+        "updated_at": "2024-06-01T12:00:00Z",
+        "pushed_at": "2024-06-01T12:00:00Z",
+        "git_url": f"git://github.com/{full_name}.git",
+        "ssh_url": f"git@github.com:{full_name}.git",
+        "clone_url": f"https://github.com/{full_name}.git",
+        "svn_url": f"https://github.com/{full_name}",
+        "homepage": None,
+        "size": 1024 + index,
+        "stargazers_count": index % 500,
+        "watchers_count": index % 500,
+        "language": "Java",
+        "has_issues": False,
+        "has_projects": False,
+        "has_downloads": True,
+        "has_wiki": False,
+        "has_pages": False,
+        "has_discussions": False,
+        "forks_count": 0,
+        "archived": False,
+        "disabled": False,
+        "open_issues_count": 0,
+        "license": {"key": "apache-2.0", "name": "Apache License 2.0", "spdx_id": "Apache-2.0"},
+        "allow_forking": True,
+        "is_template": False,
+        "topics": [],
+        "visibility": "public",
+        "forks": 0,
+        "open_issues": 0,
+        "watchers": index % 500,
+        "default_branch": "main",
+        "permissions": {"admin": True, "maintain": True, "push": True, "triage": True, "pull": True},
+    }
+    # The listing has a url for every related resource, they make up most of each repository's size
+    for resource in ("forks", "keys", "collaborators", "teams", "hooks", "issue_events", "events", "assignees",
+                     "branches", "tags", "blobs", "git_tags", "git_refs", "trees", "statuses", "languages",
+                     "stargazers", "contributors", "subscribers", "subscription", "commits", "git_commits",
+                     "comments", "issue_comment", "contents", "compare", "merges", "archive", "downloads",
+                     "issues", "pulls", "milestones", "notifications", "labels", "releases", "deployments"):
+        repository[f"{resource}_url"] = f"{api}/{resource.replace('_', '/')}{{/id}}"
+    return repository
+
+
+def serve_fake_api(repositories: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _json(self, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for header, value in (headers or {}).items():
+                self.send_header(header, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            base_url = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+            url = urlparse(self.path)
+            if url.path == f"/orgs/{ORGANIZATION}":
+                self._json({"login": ORGANIZATION, "url": f"{base_url}/orgs/{ORGANIZATION}"})
+            elif url.path == f"/orgs/{ORGANIZATION}/repos":
+                page = int(parse_qs(url.query).get("page", ["1"])[0])
+                start = (page - 1) * PAGE_SIZE
+                end = min(start + PAGE_SIZE, repositories)
+                headers = {}
+                if end < repositories:
+                    headers["Link"] = f'<{base_url}/orgs/{ORGANIZATION}/repos?per_page={PAGE_SIZE}&page={page + 1}>; ' \
+                                      f'rel="next"'
+                self._json([fake_repository(base_url, index) for index in range(start, end)], headers)
+            else:
+                self.send_error(404)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(function) -> tuple[int, object]:
+    """The peak traced memory while running `function`, and what it returned."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, result
+
+
+def benchmark_listing(repositories: int):
+    server = serve_fake_api(repositories)
+    try:
+        github = Github(base_url=f"http://127.0.0.1:{server.server_address[1]}", per_page=PAGE_SIZE)
+        organization = github.get_organization(ORGANIZATION)
+
+        def full_repositories():
+            return len(list(organization.get_repos()))
+
+        def records():
+            repositories = iter_pages(organization.get_repos())
+            return len([RepositoryRecord.from_repository(repository) for repository in repositories])
+
+        def streamed():
+            # What `sync` and `code-scanning enable` do with each repository, without keeping any of them
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                return sum(bounded_map(executor, lambda repository: 1, iter_pages(organization.get_repos()), window=8))
+
+        print(f"{repositories} repositories:")
+        for label, function in (("Repository", full_repositories), ("RepositoryRecord", records),
+                                ("streamed", streamed)):
+            peak, count = measure(function)
+            assert count == repositories, f"Listed {count} of {repositories} repositories"
+            print(f"\t{label:<18}{peak / (1 << 20):>10.1f} MiB peak{peak / repositories:>10.0f} bytes per repository")
+    finally:
+        server.shutdown()
+
+
+def benchmark_alerts(alerts: int):
+    alert = {
+        "number": 0,
+        "state": "open",
+        "rule": {"id": "java/sql-injection", "severity": "error", "security_severity_level": "high",
+                 "tags": ["security", "external/cwe/cwe-089"]},
+        "tool": {"name": "CodeQL", "version": "2.17.0"},
+        "most_recent_instance": {"ref": "refs/heads/main", "category": "/language:java",
+                                 "location": {"path": "src/main/java/App.java", "start_line": 10, "end_line": 10}},
+        "repository": {"full_name": f"{ORGANIZATION}/upstream__project"},
+        "created_at": "2024-06-01T12:00:00Z",
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "alerts.json"
+        with open(path, "w") as export_file:
+            export_file.write("[")
+            for number in range(alerts):
+                alert["number"] = number
+                export_file.write(("," if number else "") + json.dumps(alert))
+            export_file.write("]")
+
+        def loaded():
+            with open(path) as export_file:
+                return len(json.load(export_file))
+
+        def streamed():
+            return sum(1 for _ in iter_alert_export(path))
+
+        print(f"{alerts} alerts:")
+        for label, function in (("json.load", loaded), ("iter_alert_export", streamed)):
+            peak, count = measure(function)
+            assert count == alerts
+            print(f"\t{label:<18}{peak / (1 << 20):>10.1f} MiB peak")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the peak memory of listing and reading large exports.")
+    parser.add_argument("--repositories", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--alerts", type=int, default=100000)
+    args = parser.parse_args()
+    for repositories in args.repositories:
+        benchmark_listing(repositories)
+    benchmark_alerts(args.alerts)
+
+
+if __name__ == '__main__':
+    main()
@@ -30,6 +30,9 @@ setup(
             "rich-argparse>=1.0.0",
             "python-dotenv>=1.0.0",
         ],
+        "analytics": [
+            "numpy>=1.24",
+        ],
         "test": [
             "pytest>=6",
             "pytest-cov",
@@ -0,0 +1,209 @@
+"""
+Analytics over the organization's code scanning alerts, as exported by `scripts/code_scanning_puller2.py`.
+
+Requires the `analytics` extra: `pip install .[analytics]`
+"""
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from oss_security_assessments.util import iter_alert_export, upstream_repository_name
+
+# Security severities are only set on security queries, every rule has a severity
+SECURITY_SEVERITIES = ("critical", "high", "medium", "low", "none")
+SEVERITIES = ("error", "warning", "note", "none")
+AGE_BUCKET_DAYS = (7, 30, 90, 365)
+AGE_BUCKETS = ("< 1 week", "< 1 month", "< 3 months", "< 1 year", ">= 1 year")
+UNKNOWN_AGE = "unknown"
+
+
+def alert_security_severity(alert: dict) -> str:
+    return (alert.get('rule') or {}).get('security_severity_level') or "none"
+
+
+def alert_severity(alert: dict) -> str:
+    return (alert.get('rule') or {}).get('severity') or "none"
+
+
+def alert_language(alert: dict) -> str:
+    """The analyzed language, from a category like `/language:python`, falling back to the tool name."""
+    category = (alert.get('most_recent_instance') or {}).get('category') or ""
+    if "language:" in category:
+        return category.split("language:", 1)[1]
+    return (alert.get('tool') or {}).get('name') or "unknown"
+
+
+class _Categories:
+    """Interns the values of a column while it's being read, so the column is stored as integer codes."""
+
+    def __init__(self):
+        self.codes: dict[str, int] = {}
+        self.values: list[int] = []
+
+    def append(self, value: str):
+        self.values.append(self.codes.setdefault(value, len(self.codes)))
+
+    def column(self) -> "CategoricalColumn":
+        return CategoricalColumn(np.array(list(self.codes), dtype=object), np.array(self.values, dtype=np.int32))
+
+
+@dataclass
+class CategoricalColumn:
+    categories: np.ndarray
+    codes: np.ndarray
+
+    def counts(self, mask: Optional[np.ndarray] = None) -> dict[str, int]:
+        codes = self.codes if mask is None else self.codes[mask]
+        counts = np.bincount(codes, minlength=len(self.categories))
+        order = np.argsort(-counts, kind="stable")
+        return {self.categories[i]: int(counts[i]) for i in order if counts[i]}
+
+    def equals(self, value: str) -> np.ndarray:
+        matches = np.flatnonzero(self.categories == value)
+        if not len(matches):
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == matches[0]
+
+
+class AlertFrame:
+    """The alerts of an export stored column by column, so aggregations are vectorized."""
+    repository: CategoricalColumn
+    upstream: CategoricalColumn
+    rule: CategoricalColumn
+    security_severity: CategoricalColumn
+    severity: CategoricalColumn
+    language: CategoricalColumn
+    state: CategoricalColumn
+    number: np.ndarray
+    created_at: np.ndarray
+
+    def __init__(self, alerts: Iterable[dict]):
+        repository, upstream, rule, security_severity, severity, language, state = (_Categories() for _ in range(7))
+        number: list[int] = []
+        created_at: list[str] = []
+        for alert in alerts:
+            repository_name = (alert.get('repository') or {}).get('full_name', "unknown")
+            repository.append(repository_name)
+            upstream.append(upstream_repository_name(repository_name))
+            rule.append((alert.get('rule') or {}).get('id') or "unknown")
+            security_severity.append(alert_security_severity(alert))
+            severity.append(alert_severity(alert))
+            language.append(alert_language(alert))
+            state.append(alert.get('state') or "unknown")
+            number.append(alert.get('number', 0))
+            # Drop the `Z` suffix, numpy datetimes are timezone naive and GitHub always uses UTC
+            created_at.append((alert.get('created_at') or "NaT").rstrip("Z"))
+        self.repository = repository.column()
+        self.upstream = upstream.column()
+        self.rule = rule.column()
+        self.security_severity = security_severity.column()
+        self.severity = severity.column()
+        self.language = language.column()
+        self.state = state.column()
+        self.number = np.array(number, dtype=np.int64)
+        self.created_at = np.array(created_at, dtype="datetime64[s]")
+
+    @classmethod
+    def load(cls, path: Path) -> "AlertFrame":
+        return cls(iter_alert_export(path))
+
+    def __len__(self) -> int:
+        return len(self.number)
+
+    def mask(self, state: Optional[str] = None) -> Optional[np.ndarray]:
+        return None if state is None else self.state.equals(state)
+
+    def age_buckets(self, now: Optional[datetime] = None, mask: Optional[np.ndarray] = None) -> dict[str, int]:
+        """Count the alerts by age, alerts without a creation date are counted as `unknown`."""
+        now = np.datetime64((now or datetime.now(timezone.utc)).replace(tzinfo=None), "s")
+        known = ~np.isnat(self.created_at)
+        if mask is not None:
+            unknown = int((mask & ~known).sum())
+            known &= mask
+        else:
+            unknown = int((~known).sum())
+        # NaT would turn into the smallest int64 and land in the youngest bucket
+        ages = (now - self.created_at[known]).astype("timedelta64[D]").astype(np.int64)
+        counts = np.bincount(np.digitize(ages, AGE_BUCKET_DAYS), minlength=len(AGE_BUCKETS))
+        buckets = {label: int(count) for label, count in zip(AGE_BUCKETS, counts)}
+        if unknown:
+            buckets[UNKNOWN_AGE] = unknown
+        return buckets
+
+    def top_repositories(self, severity: str = "critical", top: int = 10, mask: Optional[np.ndarray] = None):
+        """The repositories with the most alerts of a security severity."""
+        severity_mask = self.security_severity.equals(severity)
+        if mask is not None:
+            severity_mask &= mask
+        return dict(list(self.repository.counts(severity_mask).items())[:top])
+
+    def _keys(self, repository_codes: np.ndarray) -> np.ndarray:
+        return (repository_codes.astype(np.int64) << 32) | self.number
+
+    def new_alerts(self, previous: "AlertFrame") -> np.ndarray:
+        """A mask of the alerts in this export that weren't in the previous one."""
+        index = {name: code for code, name in enumerate(self.repository.categories)}
+        # Translate the previous export's repository codes into this export's, unknown repositories map to -1
+        translation = np.array([index.get(name, -1) for name in previous.repository.categories], dtype=np.int64)
+        previous_codes = translation[previous.repository.codes] if len(previous) else np.array([], dtype=np.int64)
+        previous_keys = (previous_codes << 32) | previous.number
+        return ~np.isin(self._keys(self.repository.codes), previous_keys)
+
+
+def count_deltas(current: dict[str, int], previous: dict[str, int]) -> dict[str, int]:
+    """The change in count per key, largest changes first, leaving out keys that didn't change."""
+    deltas = {key: current.get(key, 0) - previous.get(key, 0) for key in current.keys() | previous.keys()}
+    return dict(sorted(((k, v) for k, v in deltas.items() if v), key=lambda item: -abs(item[1])))
+
+
+def _print_counts(title: str, counts: dict[str, int], top: Optional[int] = None, signed: bool = False):
+    print(f"{title}:")
+    items = list(counts.items())
+    for key, count in items[:top] if top else items:
+        print(f"\t{key}: {count:+d}" if signed else f"\t{key}: {count}")
+    if top and len(items) > top:
+        print(f"\t... and {len(items) - top} more")
+
+
+def print_alert_report(frame: AlertFrame, top: int = 10, state: Optional[str] = None):
+    mask = frame.mask(state)
+    total = len(frame) if mask is None else int(mask.sum())
+    print(f"🎉 {total} alerts" + (f" in state `{state}`" if state else ""))
+    _print_counts("By security severity", frame.security_severity.counts(mask))
+    _print_counts("By severity", frame.severity.counts(mask))
+    _print_counts("By language", frame.language.counts(mask))
+    _print_counts("By age", frame.age_buckets(mask=mask))
+    _print_counts("By rule", frame.rule.counts(mask), top)
+    _print_counts("By upstream project", frame.upstream.counts(mask), top)
+    _print_counts("Top repositories by critical alerts", frame.top_repositories("critical", top, mask))
+
+
+def print_alert_delta_report(
+        frame: AlertFrame,
+        previous: AlertFrame,
+        top: int = 10,
+        state: Optional[str] = None
+):
+    mask = frame.mask(state)
+    previous_mask = previous.mask(state)
+    new = frame.new_alerts(previous)
+    fixed = previous.new_alerts(frame)
+    if mask is not None:
+        new &= mask
+        fixed &= previous_mask
+    print(f"🎉 {int(new.sum())} new alerts, {int(fixed.sum())} alerts no longer present")
+    for title, column in (
+            ("security severity", "security_severity"),
+            ("severity", "severity"),
+            ("rule", "rule"),
+            ("upstream project", "upstream"),
+    ):
+        _print_counts(
+            f"Change by {title}",
+            count_deltas(getattr(frame, column).counts(mask), getattr(previous, column).counts(previous_mask)),
+            top,
+            signed=True
+        )
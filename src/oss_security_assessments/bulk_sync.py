@@ -0,0 +1,285 @@
+"""
+Syncs every fork in an organization with its upstream, without letting one diverged fork stop the rest.
+
+Each `merge-upstream` call is classified, and the forks that couldn't be synced are kept in a persistent triage
+queue to be retried or force-reset to their upstream later.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+from github import Github
+from github.GithubException import GithubException
+
+from oss_security_assessments.rate_limit import RateLimiter
+from oss_security_assessments.reconcile import ReconciliationIndex
+from oss_security_assessments.records import RepositoryRecord
+from oss_security_assessments.scheduler import ScheduleHistory, UpstreamActivity
+from oss_security_assessments.util import bounded_map, error_message
+
+FAST_FORWARD = "fast-forward"
+MERGED = "merged"
+UP_TO_DATE = "up-to-date"
+CONFLICT = "conflict"
+UPSTREAM_DELETED = "upstream-deleted"
+ARCHIVED = "archived"
+FAILED = "failed"
+
+SUCCESSFUL_OUTCOMES = frozenset({FAST_FORWARD, MERGED, UP_TO_DATE})
+
+_MERGE_TYPES = {
+    "fast-forward": FAST_FORWARD,
+    "merge": MERGED,
+    "none": UP_TO_DATE,
+}
+
+
+@dataclass
+class SyncOutcome:
+    repository: str
+    outcome: str
+    message: Optional[str] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.outcome in SUCCESSFUL_OUTCOMES
+
+
+def classify_exception(e: GithubException) -> str:
+    message = error_message(e).lower()
+    if e.status == 409:
+        return CONFLICT
+    if e.status == 404 or "not a fork" in message:
+        return UPSTREAM_DELETED
+    if "archived" in message:
+        return ARCHIVED
+    if e.status == 422 and ("merge" in message or "conflict" in message or "diverged" in message):
+        return CONFLICT
+    return FAILED
+
+
+def sync_one(
+        repository: RepositoryRecord,
+        limiter: RateLimiter,
+        after_sync: Optional[Callable[[RepositoryRecord, RateLimiter], None]] = None,
+        index: Optional[ReconciliationIndex] = None
+) -> SyncOutcome:
+    """
+    Merge the upstream into the fork's default branch, then run `after_sync` on the forks that synced.
+    `after_sync` is given the same limiter, so its requests are throttled and backed off along with the merges.
+    Never raises, any error is returned as the fork's outcome.
+    """
+    if repository.archived:
+        return SyncOutcome(repository.name, ARCHIVED)
+    if index is not None and index.is_deleted(repository.full_name):
+        return SyncOutcome(repository.name, UPSTREAM_DELETED, "The upstream was deleted, according to the index")
+    try:
+        _, data = limiter.call(
+            repository._requester.requestJsonAndCheck,
+            "POST",
+            f"{repository.url}/merge-upstream",
+            input={"branch": repository.default_branch}
+        )
+    except GithubException as e:
+        return SyncOutcome(repository.name, classify_exception(e), error_message(e))
+    except Exception as e:
+        # Connection resets and timeouts come from `requests`, not PyGithub
+        return SyncOutcome(repository.name, FAILED, error_message(e))
+    outcome = SyncOutcome(
+        repository.name,
+        _MERGE_TYPES.get((data or {}).get('merge_type'), MERGED),
+        (data or {}).get('message'),
+    )
+    if after_sync is not None:
+        try:
+            after_sync(repository, limiter)
+        except Exception as e:
+            return SyncOutcome(repository.name, FAILED, f"Synced, but configuring failed: {error_message(e)}")
+    return outcome
+
+
+class TriageQueue:
+    """The forks that failed to sync, persisted as JSON so they can be retried or reset in a later run."""
+    _path: Path
+    _entries: dict[str, dict]
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._entries = {}
+        if path.exists():
+            with open(path) as triage_file:
+                self._entries = json.load(triage_file)
+
+    def record(self, outcome: SyncOutcome):
+        """Add a failed outcome to the queue, or remove the repository from the queue once it syncs."""
+        if outcome.succeeded:
+            self._entries.pop(outcome.repository, None)
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        entry = self._entries.setdefault(outcome.repository, {"first_seen": now, "attempts": 0})
+        entry["outcome"] = outcome.outcome
+        entry["message"] = outcome.message
+        entry["last_seen"] = now
+        entry["attempts"] += 1
+
+    def remove(self, name: str):
+        self._entries.pop(name, None)
+
+    def entries(self) -> dict[str, dict]:
+        return dict(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def save(self):
+        with open(self._path, "w") as triage_file:
+            json.dump(self._entries, triage_file, indent=4, sort_keys=True)
+
+
+def sync_in_bulk(
+        repositories: Iterable[RepositoryRecord],
+        limiter: RateLimiter,
+        triage: TriageQueue,
+        history: Optional[ScheduleHistory] = None,
+        after_sync: Optional[Callable[[RepositoryRecord, RateLimiter], None]] = None,
+        concurrency: int = 4,
+        index: Optional[ReconciliationIndex] = None,
+) -> list[SyncOutcome]:
+    """
+    Sync every repository with at most `concurrency` requests in flight. Every repository gets an outcome,
+    the triage queue and history are updated as the outcomes arrive, in the order the repositories were given.
+    Repositories are only taken from `repositories` as workers free up.
+    The triage queue and history are saved even if the run is interrupted, keeping the outcomes so far.
+    """
+    outcomes = []
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            sync = lambda repository: sync_one(repository, limiter, after_sync, index)
+            for outcome in bounded_map(executor, sync, repositories, window=2 * concurrency):
+                print(f"\t{outcome.repository}: {outcome.outcome}")
+                outcomes.append(outcome)
+                triage.record(outcome)
+                if history is not None:
+                    if outcome.succeeded:
+                        history.record_success(outcome.repository)
+                    else:
+                        history.record_failure(outcome.repository)
+    finally:
+        triage.save()
+        if history is not None:
+            history.save()
+    return outcomes
+
+
+def _query_repositories(
+        requester,
+        full_names: Iterable[str],
+        selection: str,
+        limiter: RateLimiter,
+        batch_size: int,
+        description: str
+) -> Iterator[tuple[str, Optional[dict]]]:
+    """Query `selection` on each repository, `batch_size` repositories per GraphQL query."""
+    names = list(full_names)
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        fields = []
+        for index, name in enumerate(batch):
+            owner, repository = name.split("/", 1)
+            fields.append(
+                f"r{index}: repository(owner: {json.dumps(owner)}, name: {json.dumps(repository)}) {selection}"
+            )
+        try:
+            _, response = limiter.call(
+                requester.requestJsonAndCheck, "POST", "/graphql", input={"query": "query { " + " ".join(fields) + " }"}
+            )
+        except Exception as e:
+            print(f"\tFailed to read the {description} of {len(batch)} repositories: {error_message(e)}")
+            continue
+        data = response.get('data') or {}
+        for index, name in enumerate(batch):
+            yield name, data.get(f"r{index}")
+
+
+def default_branch_heads(
+        requester,
+        full_names: Iterable[str],
+        limiter: RateLimiter,
+        batch_size: int = 50
+) -> dict[str, str]:
+    """The default branch head SHA of each repository, `batch_size` repositories per GraphQL query."""
+    heads = {}
+    for name, repository in _query_repositories(
+            requester, full_names, "{ defaultBranchRef { target { oid } } }", limiter, batch_size, "heads"
+    ):
+        branch = (repository or {}).get('defaultBranchRef')
+        if branch is not None:
+            heads[name] = branch['target']['oid']
+    return heads
+
+
+def upstream_activity(
+        requester,
+        fork_full_names: Iterable[str],
+        limiter: RateLimiter,
+        batch_size: int = 50
+) -> dict[str, UpstreamActivity]:
+    """When each fork's upstream was last pushed to and how many stars it has, keyed by the fork's full name."""
+    activity = {}
+    for name, repository in _query_repositories(
+            requester, fork_full_names, "{ parent { pushedAt stargazerCount } }", limiter, batch_size, "upstreams"
+    ):
+        parent = (repository or {}).get('parent')
+        if parent is not None:
+            pushed_at = parent.get('pushedAt')
+            activity[name] = UpstreamActivity(
+                pushed_at=datetime.fromisoformat(pushed_at.replace("Z", "+00:00")) if pushed_at else None,
+                stargazers_count=parent.get('stargazerCount') or 0,
+            )
+    return activity
+
+
+def force_reset(github: Github, fork_full_name: str, limiter: RateLimiter) -> str:
+    """
+    Point the fork's default branch at its upstream's default branch head, discarding the fork's own commits.
+    Returns the SHA the branch was reset to.
+    """
+    fork = limiter.call(github.get_repo, fork_full_name)
+    if fork.parent is None:
+        raise ValueError(f"{fork_full_name} is no longer a fork, its upstream was deleted.")
+    upstream_branch = limiter.call(fork.parent.get_branch, fork.parent.default_branch)
+    sha = upstream_branch.commit.sha
+    # The fork shares its object storage with the upstream, so the commit is already reachable from the fork
+    limiter.call(
+        fork._requester.requestJsonAndCheck,
+        "PATCH",
+        f"{fork.url}/git/refs/heads/{fork.default_branch}",
+        input={"sha": sha, "force": True}
+    )
+    return sha
+
+
+def print_sync_report(outcomes: list[SyncOutcome], triage: TriageQueue):
+    counts: dict[str, int] = {}
+    for outcome in outcomes:
+        counts[outcome.outcome] = counts.get(outcome.outcome, 0) + 1
+    print(f"🎉 Synced {sum(1 for o in outcomes if o.succeeded)} of {len(outcomes)} repositories:")
+    for outcome, count in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"\t{outcome}: {count}")
+    if len(triage):
+        print(f"{len(triage)} repositories are waiting in the triage queue.")
+
+
+def print_triage_queue(triage: TriageQueue):
+    entries = triage.entries()
+    print(f"{len(entries)} repositories in the triage queue:")
+    for name, entry in sorted(entries.items(), key=lambda item: (item[1]["outcome"], item[0])):
+        print(f"\t[{entry['outcome']}] {name} ({entry['attempts']} attempts since {entry['first_seen']})")
+        if entry.get("message"):
+            print(f"\t\t{entry['message']}")
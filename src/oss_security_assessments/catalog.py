@@ -0,0 +1,332 @@
+"""
+A compact, memory-mappable catalog of the repositories managed by this project.
+
+The catalog is a single little-endian file:
+
+- a header with the counts and the offset of every section,
+- fixed size records sorted by upstream name, so lookups are a binary search over the mapped file,
+- an index of record numbers sorted by fork name,
+- the language entries referenced by the records,
+- a table of interned strings (repository and language names) stored once each.
+
+Strings are compared as UTF-8 bytes straight from the mapping, nothing is parsed up front when the catalog is opened.
+"""
+import json
+import mmap
+import os
+import struct
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, TextIO
+
+from oss_security_assessments.util import upstream_repository_name
+
+MAGIC = b"OSAC"
+VERSION = 1
+
+# magic, version, record count, string count, language entry count,
+# offsets of the records, fork index, language entries, string offsets and string data
+_HEADER = struct.Struct("<4sHxxIIIQQQQQ")
+# upstream string id, fork string id, first language entry, language count, default setup state, last synced sha
+_RECORD = struct.Struct("<IIIHBx20s")
+# language string id, bytes of code
+_LANGUAGE = struct.Struct("<IQ")
+_U32 = struct.Struct("<I")
+
+_NO_STRING = 0xFFFFFFFF
+_NO_SHA = bytes(20)
+
+DEFAULT_SETUP_STATES = ("unknown", "not-configured", "configured")
+
+
+@dataclass
+class CatalogEntry:
+    """A mutable description of a repository, used to build a catalog."""
+    upstream: str
+    fork: Optional[str] = None
+    languages: dict[str, int] = field(default_factory=dict)
+    default_setup: str = "unknown"
+    last_synced_sha: Optional[str] = None
+
+
+class CatalogRecord:
+    """A read only view of one record in a mapped catalog, fields are decoded on access."""
+    __slots__ = ("_catalog", "_index")
+
+    def __init__(self, catalog: "RepositoryCatalog", index: int):
+        self._catalog = catalog
+        self._index = index
+
+    def _fields(self) -> tuple:
+        return self._catalog._record(self._index)
+
+    @property
+    def upstream(self) -> str:
+        return self._catalog._string(self._fields()[0])
+
+    @property
+    def fork(self) -> Optional[str]:
+        fork_id = self._fields()[1]
+        return None if fork_id == _NO_STRING else self._catalog._string(fork_id)
+
+    @property
+    def languages(self) -> dict[str, int]:
+        _, _, start, count, _, _ = self._fields()
+        return dict(self._catalog._languages(start, count))
+
+    @property
+    def default_setup(self) -> str:
+        return DEFAULT_SETUP_STATES[self._fields()[4]]
+
+    @property
+    def last_synced_sha(self) -> Optional[str]:
+        sha = self._fields()[5]
+        return None if sha == _NO_SHA else sha.hex()
+
+    def to_entry(self) -> CatalogEntry:
+        return CatalogEntry(
+            upstream=self.upstream,
+            fork=self.fork,
+            languages=self.languages,
+            default_setup=self.default_setup,
+            last_synced_sha=self.last_synced_sha,
+        )
+
+    def __repr__(self):
+        return f"CatalogRecord(upstream={self.upstream!r}, fork={self.fork!r})"
+
+
+class RepositoryCatalog:
+    """A catalog file mapped into memory. Use it as a context manager, or call `close` when done."""
+
+    def __init__(self, path: Path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        (
+            magic, version,
+            self._record_count, self._string_count, _,
+            self._records_offset, self._fork_index_offset, self._languages_offset,
+            self._string_offsets_offset, self._string_data_offset,
+        ) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a repository catalog.")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"{path} has catalog version {version}, expected {VERSION}.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def _string_span(self, string_id: int) -> tuple[int, int]:
+        start, end = struct.unpack_from("<II", self._map, self._string_offsets_offset + string_id * _U32.size)
+        return self._string_data_offset + start, self._string_data_offset + end
+
+    def _string_bytes(self, string_id: int) -> bytes:
+        start, end = self._string_span(string_id)
+        return self._map[start:end]
+
+    def _string(self, string_id: int) -> str:
+        return self._string_bytes(string_id).decode()
+
+    def _record(self, index: int) -> tuple:
+        return _RECORD.unpack_from(self._map, self._records_offset + index * _RECORD.size)
+
+    def _languages(self, start: int, count: int) -> Iterator[tuple[str, int]]:
+        offset = self._languages_offset + start * _LANGUAGE.size
+        for language_id, size in _LANGUAGE.iter_unpack(self._map[offset:offset + count * _LANGUAGE.size]):
+            yield self._string(language_id), size
+
+    def _bisect(self, name: bytes, count: int, string_id_at) -> Optional[int]:
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            candidate = self._string_bytes(string_id_at(middle))
+            if candidate == name:
+                return middle
+            if candidate < name:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def get(self, upstream: str) -> Optional[CatalogRecord]:
+        """Look up a repository by its upstream `owner/name`."""
+        index = self._bisect(upstream.encode(), self._record_count, lambda i: self._record(i)[0])
+        return None if index is None else CatalogRecord(self, index)
+
+    def get_by_fork(self, fork: str) -> Optional[CatalogRecord]:
+        """Look up a repository by the full name of its fork in the organization."""
+
+        def fork_string_id(position: int) -> int:
+            return self._record(self._fork_record(position))[1]
+
+        position = self._bisect(fork.encode(), self._fork_count(), fork_string_id)
+        return None if position is None else CatalogRecord(self, self._fork_record(position))
+
+    def _fork_count(self) -> int:
+        return (self._languages_offset - self._fork_index_offset) // _U32.size
+
+    def _fork_record(self, position: int) -> int:
+        return _U32.unpack_from(self._map, self._fork_index_offset + position * _U32.size)[0]
+
+    def __contains__(self, upstream: str) -> bool:
+        return self.get(upstream) is not None
+
+    def __len__(self) -> int:
+        return self._record_count
+
+    def __iter__(self) -> Iterator[CatalogRecord]:
+        for index in range(self._record_count):
+            yield CatalogRecord(self, index)
+
+    def upstream_names(self) -> Iterator[memoryview]:
+        """
+        The upstream names as UTF-8 slices of the mapping, in sorted order, without decoding or copying.
+
+        The slices must be released before the catalog is closed.
+        """
+        records = self._view[self._records_offset:self._records_offset + self._record_count * _RECORD.size]
+        try:
+            for fields in _RECORD.iter_unpack(records):
+                start, end = self._string_span(fields[0])
+                yield self._view[start:end]
+        finally:
+            records.release()
+
+
+class CatalogBuilder:
+    """Collects `CatalogEntry`s and writes them out as a catalog file."""
+    _entries: dict[str, CatalogEntry]
+
+    def __init__(self):
+        self._entries = {}
+
+    @classmethod
+    def from_catalog(cls, catalog: RepositoryCatalog) -> "CatalogBuilder":
+        builder = cls()
+        for record in catalog:
+            builder.add(record.to_entry())
+        return builder
+
+    def entry(self, upstream: str) -> CatalogEntry:
+        """The entry for the upstream repository, created if it doesn't exist yet."""
+        if upstream not in self._entries:
+            self._entries[upstream] = CatalogEntry(upstream=upstream)
+        return self._entries[upstream]
+
+    def add(self, entry: CatalogEntry):
+        self._entries[entry.upstream] = entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def write(self, path: Path):
+        """Write the catalog, replacing any existing file atomically so open mappings stay valid."""
+        strings: dict[bytes, int] = {}
+
+        def intern(value: str) -> int:
+            encoded = value.encode()
+            if encoded not in strings:
+                strings[encoded] = len(strings)
+            return strings[encoded]
+
+        entries = sorted(self._entries.values(), key=lambda e: e.upstream.encode())
+        records = bytearray()
+        languages = bytearray()
+        language_count = 0
+        for entry in entries:
+            if entry.default_setup not in DEFAULT_SETUP_STATES:
+                raise ValueError(f"Unknown default setup state `{entry.default_setup}` for {entry.upstream}")
+            records += _RECORD.pack(
+                intern(entry.upstream),
+                _NO_STRING if entry.fork is None else intern(entry.fork),
+                language_count,
+                len(entry.languages),
+                DEFAULT_SETUP_STATES.index(entry.default_setup),
+                bytes.fromhex(entry.last_synced_sha) if entry.last_synced_sha else _NO_SHA,
+            )
+            for language, size in entry.languages.items():
+                languages += _LANGUAGE.pack(intern(language), size)
+                language_count += 1
+
+        forked = sorted(
+            (index for index, entry in enumerate(entries) if entry.fork is not None),
+            key=lambda index: entries[index].fork.encode()
+        )
+        fork_index = b"".join(_U32.pack(index) for index in forked)
+
+        string_offsets = bytearray()
+        string_data = bytearray()
+        for encoded in strings:
+            string_offsets += _U32.pack(len(string_data))
+            string_data += encoded
+        string_offsets += _U32.pack(len(string_data))
+
+        records_offset = _HEADER.size
+        fork_index_offset = records_offset + len(records)
+        languages_offset = fork_index_offset + len(fork_index)
+        string_offsets_offset = languages_offset + len(languages)
+        string_data_offset = string_offsets_offset + len(string_offsets)
+        header = _HEADER.pack(
+            MAGIC, VERSION,
+            len(entries), len(strings), language_count,
+            records_offset, fork_index_offset, languages_offset, string_offsets_offset, string_data_offset,
+        )
+
+        temporary_path = path.with_name(path.name + ".tmp")
+        with open(temporary_path, "wb") as catalog_file:
+            for section in (header, records, fork_index, languages, string_offsets, string_data):
+                catalog_file.write(section)
+        os.replace(temporary_path, path)
+
+
+def import_repository_names(builder: CatalogBuilder, lines: Iterable[str]):
+    """Import upstream `owner/name` lines, like `repos_to_add.txt` or `scripts/repository_names.txt`."""
+    for line in lines:
+        name = line.strip()
+        if name:
+            builder.entry(name)
+
+
+def import_repository_languages(builder: CatalogBuilder, languages_file: TextIO):
+    """Import the `repository_languages.json` written by `scripts/pull_languages.py`."""
+    for item in json.load(languages_file):
+        fork = item['repository_name']
+        entry = builder.entry(upstream_repository_name(fork))
+        entry.fork = fork
+        entry.languages = item['languages']
+        state = (item.get('default_code_scanning') or {}).get('state')
+        if isinstance(state, str) and state in DEFAULT_SETUP_STATES:
+            entry.default_setup = state
+
+
+def export_repository_names(catalog: RepositoryCatalog, output: TextIO):
+    for name in catalog.upstream_names():
+        output.write(f"{str(name, 'utf-8')}\n")
+        name.release()
+
+
+def export_repository_languages(catalog: RepositoryCatalog, output: TextIO):
+    """Write the catalog in the format of `repository_languages.json`, for the repositories that have been forked."""
+    json.dump(
+        [
+            {
+                'repository_name': record.fork,
+                'languages': record.languages,
+                'default_code_scanning': {'state': record.default_setup},
+            }
+            for record in catalog if record.fork is not None
+        ],
+        output,
+        indent=4
+    )
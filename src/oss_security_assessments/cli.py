@@ -1,18 +1,75 @@
 import argparse
-import random
+from datetime import datetime, timezone
 from pathlib import Path
 from time import sleep
-from typing import Iterable, Generator
+from typing import Iterable, Generator, Optional
 
 import yaml
 from dotenv import load_dotenv
-from github import Github, Auth, GithubException, UnknownObjectException
+from github import Github, Auth, UnknownObjectException
+from github.GithubException import GithubException
 from github.Organization import Organization
 from github.Repository import Repository
 
+from oss_security_assessments.bulk_sync import (
+    FAILED,
+    SyncOutcome,
+    TriageQueue,
+    default_branch_heads,
+    force_reset,
+    print_sync_report,
+    print_triage_queue,
+    sync_in_bulk,
+    sync_one,
+    upstream_activity,
+)
+from oss_security_assessments.catalog import (
+    CatalogBuilder,
+    RepositoryCatalog,
+    export_repository_languages,
+    export_repository_names,
+    import_repository_languages,
+    import_repository_names,
+)
+from oss_security_assessments.code_scanning import (
+    candidates_from_catalog,
+    candidates_from_organization,
+    enable_default_setup_in_bulk,
+    print_default_setup_report,
+)
+from oss_security_assessments.daemon import SyncDaemon
+from oss_security_assessments.fingerprints import (
+    DISMISSED_REASONS,
+    FingerprintIndex,
+    dismiss_cluster,
+    print_cluster,
+    print_clusters,
+)
 from oss_security_assessments.github_selenium import GitHubSelenium
+from oss_security_assessments.languages import load_repository_languages
+from oss_security_assessments.mirror import MirrorStore, parse_size
 from oss_security_assessments.onepassword_wrapper import OnePassword
-from .util import fibonacci
+from oss_security_assessments.plan import (
+    CORE,
+    CostModel,
+    Plan,
+    RateLimitSnapshot,
+    plan_fork,
+    plan_sync,
+    print_plan,
+    write_shards,
+)
+from oss_security_assessments.rate_limit import RateLimiter
+from oss_security_assessments.reconcile import ReconciliationIndex
+from oss_security_assessments.records import RepositoryRecord, iter_pages
+from oss_security_assessments.scheduler import (
+    PriorityWeights,
+    RepositoryScheduler,
+    ScheduleHistory,
+    fork_key,
+    upstream_key,
+)
+from .util import fibonacci, fork_repository_name, iter_alert_export
 
 
 def load_github_auth_from_github_hub() -> str:
@@ -33,15 +90,19 @@ def load_github() -> Github:
     return gh
 
 
-def configure_repository_after_fork(repo: Repository):
+def configure_repository_after_fork(repo: Repository, limiter: Optional[RateLimiter] = None):
+    """Disable the features and workflows a fork doesn't need, each request through `limiter` when given."""
+    call = limiter.call if limiter is not None else lambda function, *args, **kwargs: function(*args, **kwargs)
     print(f"Configuring {repo.name} ...")
     if repo.has_wiki or repo.has_projects or repo.has_issues:
-        repo.edit(
+        call(
+            repo.edit,
             has_issues=False,
             has_projects=False,
             has_wiki=False
         )
-    workflows = repo.get_workflows()
+    # Listing the workflows pages lazily, reading them all in one call keeps every page behind the limiter
+    workflows = call(lambda: list(repo.get_workflows()))
     for workflow in workflows:
         lower_name = workflow.name.lower()
         if "security" in lower_name or "codeql" in lower_name or "semgrep" in lower_name:
@@ -53,7 +114,8 @@ def configure_repository_after_fork(repo: Repository):
         print(f"\tDisabling {workflow.name} ...")
         # Manually disable the workflow because the API doesn't exist on PyGithub
         try:
-            repo._requester.requestJsonAndCheck(
+            call(
+                repo._requester.requestJsonAndCheck,
                 "PUT",
                 f"/repos/{repo.owner.login}/{repo.name}/actions/workflows/{workflow.id}/disable",
             )
@@ -63,17 +125,31 @@ def configure_repository_after_fork(repo: Repository):
             print(f"\t{e.data['message'] if 'message' in e.data else e.data}")
 
 
-def fork_repo_to_org(org: Organization, repo: Repository) -> (Repository, bool):
+def configure_record_after_fork(record: RepositoryRecord, limiter: Optional[RateLimiter] = None):
+    configure_repository_after_fork(record.materialize(), limiter)
+
+
+def fork_repo_to_org(
+        org: Organization,
+        repo: Repository,
+        index: Optional[ReconciliationIndex] = None
+) -> tuple[Optional[Repository], bool]:
     new_repo_name = repo.owner.login + "__" + repo.name
-    try:
-        existing_repository = org.get_repo(new_repo_name)
-        print(f"Using existing fork of {repo.name} to {org.login} with name {new_repo_name} ...")
-        return existing_repository, True
-    except UnknownObjectException:
-        pass
+    known_fork = index.resolve_fork(repo.full_name) if index is not None else None
+    if known_fork is not None and known_fork.split("/")[0].lower() == org.login.lower():
+        # The upstream may have been renamed since it was forked, the fork keeps its original name
+        new_repo_name = known_fork.split("/", 1)[1]
+    # The index knows every fork in the organization, so there's no need to look for one it doesn't know
+    if index is None or known_fork is not None:
+        try:
+            existing_repository = org.get_repo(new_repo_name)
+            print(f"Using existing fork of {repo.name} to {org.login} with name {new_repo_name} ...")
+            return existing_repository, True
+        except UnknownObjectException:
+            pass
     print(f"Forking {repo.name} to {org.login} with name {new_repo_name} ...")
     retry_count = 0
-    last_exception: GithubException = None
+    last_exception: Optional[GithubException] = None
     while retry_count < 20:
         try:
             return org.create_fork(
@@ -99,10 +175,14 @@ def fork_repo_to_org(org: Organization, repo: Repository) -> (Repository, bool):
 def fork_and_configure_repositories(
         gh_selenium: GitHubSelenium,
         organization: Organization,
-        repositories: Iterable[Repository]
+        repositories: Iterable[RepositoryRecord],
+        history: Optional[ScheduleHistory] = None,
+        index: Optional[ReconciliationIndex] = None
 ):
-    process_later: list[Repository] = list()
-    repository: Repository
+    history = history or ScheduleHistory()
+    # Only records are kept around, the full repositories are rebuilt from them when they're processed
+    process_later: list[RepositoryRecord] = list()
+    repository: RepositoryRecord
     for repository in repositories:
         # if repository.archived:
         #     print(f"Skipping {repository.name} because it's archived.")
@@ -111,27 +191,34 @@ def fork_and_configure_repositories(
             print(f"Skipping {repository.name} because it's a fork.")
             continue
 
-        new_repository, did_exist = fork_repo_to_org(organization, repository)
+        new_repository, did_exist = fork_repo_to_org(organization, repository.materialize(), index)
 
         if new_repository is None:
             print(f"Failed to fork {repository.name} to {organization.login}")
+            history.record_failure(upstream_key(repository))
+            history.save()
             continue
 
         if not did_exist:
             gh_selenium.enable_github_actions(new_repository)
 
             configure_repository_after_fork(new_repository)
+            history.record_success(new_repository.name)
+            history.save()
         else:
-            process_later.append(new_repository)
+            process_later.append(RepositoryRecord.from_repository(new_repository))
 
     print("🎉 Re-processing repositories that already existed ...")
 
-    for repository in process_later:
+    for record in process_later:
+        repository = record.materialize()
         gh_selenium.enable_github_actions(repository)
         configure_repository_after_fork(repository)
+        history.record_success(repository.name)
+        history.save()
 
 
-def fork_apache_repositories():
+def fork_apache_repositories(mirror_store: Optional[MirrorStore] = None):
     g = load_github()
     organization = g.get_organization("OSS-Security-Assessments")
     apache = g.get_organization("apache")
@@ -143,13 +230,37 @@ def fork_apache_repositories():
         direction="desc",
     )
 
-    with GitHubSelenium(one_password) as gh_selenium:
+    with GitHubSelenium(one_password, mirror_store) as gh_selenium:
         gh_selenium.login()
 
-        fork_and_configure_repositories(gh_selenium, organization, repos_to_fork)
+        fork_and_configure_repositories(
+            gh_selenium,
+            organization,
+            (RepositoryRecord.from_repository(repository) for repository in iter_pages(repos_to_fork))
+        )
+
 
+def load_scheduler(args: argparse.Namespace, key) -> RepositoryScheduler[RepositoryRecord]:
+    """Build the scheduler used to order the work from the command line arguments."""
+    languages = None
+    if args.catalog:
+        with RepositoryCatalog(args.catalog) as catalog:
+            languages = {
+                fork_repository_name(record.upstream): record.languages
+                for record in catalog if record.fork is not None
+            }
+    if args.languages:
+        languages = (languages or {}) | load_repository_languages(args.languages)
+    return RepositoryScheduler(
+        weights=PriorityWeights.parse(args.priority_weights) if args.priority_weights else None,
+        history=ScheduleHistory(args.history) if args.history else None,
+        languages=languages,
+        key=key,
+    )
 
-def lazy_load_wolfi_repositories(github: Github, repository_file) -> Generator[Repository, None, None]:
+
+def read_repository_names(repository_file) -> list[str]:
+    """Read the upstream repositories to fork, leaving out the ones that can't or shouldn't be forked."""
     repos = list()
     for line in repository_file:
         repository = line.strip()
@@ -166,58 +277,426 @@ def lazy_load_wolfi_repositories(github: Github, repository_file) -> Generator[R
     if not repos:
         raise ValueError("No repositories to fork found.")
     print(f"Loaded {len(repos)} repositories to fork...")
+    return repos
 
-    random.shuffle(repos)
 
-    for repo in repos:
-        yield github.get_repo(repo)
+def lazy_load_wolfi_repositories(
+        github: Github,
+        repository_names: Iterable[str],
+        scheduler: Optional[RepositoryScheduler[RepositoryRecord]] = None
+) -> Generator[RepositoryRecord, None, None]:
+    scheduler = scheduler or RepositoryScheduler(key=upstream_key)
+    failed = 0
+    for repo in repository_names:
+        # One deleted or renamed upstream in the list shouldn't stop every other one from being forked
+        try:
+            scheduler.push(RepositoryRecord.from_repository(github.get_repo(repo)))
+        except GithubException as e:
+            message = e.data['message'] if isinstance(e.data, dict) and 'message' in e.data else e.data
+            print(f"\tFailed to load {repo}: {message}")
+            scheduler.history.record_failure(fork_repository_name(repo))
+            failed += 1
+    if failed:
+        print(f"Skipping {failed} repositories that couldn't be loaded ...")
+        scheduler.history.save()
 
+    yield from scheduler
 
-def fork_wolfi_repositories(organization_name: str, repository_file):
+
+def fork_wolfi_repositories(
+        organization_name: str,
+        repository_names: Iterable[str],
+        scheduler: Optional[RepositoryScheduler[RepositoryRecord]] = None,
+        mirror_store: Optional[MirrorStore] = None,
+        index: Optional[ReconciliationIndex] = None
+):
     g = load_github()
+    scheduler = scheduler or RepositoryScheduler(key=upstream_key)
+    if index is not None:
+        repository_names = list(repository_names)
+        current_names = list(index.current_names(repository_names))
+        print(f"Skipping {len(repository_names) - len(current_names)} repositories whose upstream was deleted ...")
+        repository_names = current_names
 
-    repositories = lazy_load_wolfi_repositories(github=g, repository_file=repository_file)
+    repositories = lazy_load_wolfi_repositories(github=g, repository_names=repository_names, scheduler=scheduler)
 
     organization = g.get_organization(organization_name)
     one_password = OnePassword()
 
-    with GitHubSelenium(one_password) as gh_selenium:
+    with GitHubSelenium(one_password, mirror_store) as gh_selenium:
         gh_selenium.login()
 
-        fork_and_configure_repositories(gh_selenium, organization, repositories)
+        fork_and_configure_repositories(gh_selenium, organization, repositories, scheduler.history, index)
 
 
-def invoke_sync_upstream(repository: Repository):
-    default_branch = repository.default_branch
-    assert default_branch is not None
-    post_parameters = {"branch": default_branch}
-    repository._requester.requestJsonAndCheck(
-        "POST",
-        f"{repository.url}/merge-upstream",
-        input=post_parameters
+def sync_all_repositories(
+        organization_name: str,
+        triage: TriageQueue,
+        scheduler: Optional[RepositoryScheduler[RepositoryRecord]] = None,
+        only: Optional[set[str]] = None,
+        limiter: Optional[RateLimiter] = None,
+        concurrency: int = 4,
+        index: Optional[ReconciliationIndex] = None,
+        catalog_path: Optional[Path] = None
+):
+    g = load_github()
+    limiter = limiter or RateLimiter(1.0)
+    scheduler = scheduler or RepositoryScheduler(key=fork_key)
+    organization = g.get_organization(organization_name)
+    records = [
+        RepositoryRecord.from_repository(repository)
+        for repository in iter_pages(organization.get_repos(direction="desc"))
+        if only is None or repository.name in only
+    ]
+    # The forks are ordered by how active their upstreams are, which the listing doesn't include
+    activity = upstream_activity(g.requester, (record.full_name for record in records), limiter)
+    scheduler.upstreams.update({full_name.split("/", 1)[1]: signals for full_name, signals in activity.items()})
+    for record in records:
+        scheduler.push(record)
+    print(f"Syncing {len(scheduler)} repositories ...")
+    outcomes = sync_in_bulk(
+        scheduler,
+        limiter,
+        triage,
+        history=scheduler.history,
+        after_sync=configure_record_after_fork,
+        concurrency=concurrency,
+        index=index,
     )
+    print_sync_report(outcomes, triage)
+    if catalog_path is not None:
+        record_synced_shas(g, organization_name, outcomes, catalog_path, limiter)
 
 
-def sync_all_repositories(organization_name: str):
-    g = load_github()
-    organization = g.get_organization(organization_name)
-    for repository in organization.get_repos(direction="desc"):
-        print(f"Syncing {repository.name} ...")
-        invoke_sync_upstream(repository)
-        configure_repository_after_fork(repository)
+def record_synced_shas(
+        github: Github,
+        organization_name: str,
+        outcomes: list[SyncOutcome],
+        catalog_path: Path,
+        limiter: RateLimiter
+):
+    """Write the default branch head of every fork that synced to the catalog."""
+    synced = [f"{organization_name}/{outcome.repository}" for outcome in outcomes if outcome.succeeded]
+    if not synced:
+        return
+    print(f"Recording the synced SHAs of {len(synced)} forks in {catalog_path} ...")
+    heads = default_branch_heads(github.requester, synced, limiter)
+    with RepositoryCatalog(catalog_path) as catalog:
+        builder = CatalogBuilder.from_catalog(catalog)
+        for fork, sha in heads.items():
+            record = catalog.get_by_fork(fork)
+            if record is not None:
+                builder.entry(record.upstream).last_synced_sha = sha
+    builder.write(catalog_path)
+
+
+def load_rate_limit(github: Github) -> RateLimitSnapshot:
+    core = github.get_rate_limit().core
+    reset = core.reset if core.reset.tzinfo else core.reset.replace(tzinfo=timezone.utc)
+    return RateLimitSnapshot(
+        remaining=core.remaining,
+        limit=core.limit,
+        reset_in=max((reset - datetime.now(timezone.utc)).total_seconds(), 0),
+    )
+
+
+def check_plan(
+        args: argparse.Namespace,
+        plan: Plan,
+        costs: CostModel,
+        shard_path: Path,
+        names: dict[str, str]
+) -> bool:
+    """Print the plan when asked for and enforce the budget. Returns whether the run should go ahead."""
+    rate_limit = load_rate_limit(load_github())
+    over_budget = args.budget is not None and plan.requests()[CORE] > args.budget
+    if args.plan or over_budget:
+        print_plan(plan, costs, rate_limit, args.budget)
+    if over_budget and args.shard:
+        for path in write_shards(plan, args.budget, shard_path, names):
+            print(f"Wrote shard {path}")
+        return False
+    if over_budget:
+        raise SystemExit(
+            f"Refusing to start, the run needs {plan.requests()[CORE]} core requests "
+            f"and the budget is {args.budget}. Use --shard to split it into runs within budget."
+        )
+    return not args.plan
+
+
+def load_cost_model(args: argparse.Namespace) -> CostModel:
+    return CostModel(
+        workflows_per_repository=args.workflows_per_repository,
+        uses_mirror=getattr(args, "mirror_directory", None) is not None,
+    )
 
 
 def cli_sync_all_repositories(args: argparse.Namespace):
-    sync_all_repositories(organization_name=args.organization)
+    only = None
+    if args.only:
+        with args.only:
+            only = {line.strip() for line in args.only if line.strip()}
+    if args.plan or args.budget is not None:
+        costs = load_cost_model(args)
+        if args.catalog:
+            with RepositoryCatalog(args.catalog) as catalog:
+                forks = [
+                    record.fork.split("/", 1)[1] for record in catalog
+                    if record.fork is not None and record.fork.startswith(args.organization + "/")
+                ]
+        else:
+            print("No catalog given, listing the organization ...")
+            organization = load_github().get_organization(args.organization)
+            forks = [repository.name for repository in iter_pages(organization.get_repos())]
+        listing_size = len(forks)
+        if only is not None:
+            forks = [fork for fork in forks if fork in only]
+        plan = plan_sync(forks, costs, records_shas=args.catalog is not None, listing_size=listing_size)
+        if not check_plan(args, plan, costs, Path(f"sync-{args.organization}.txt"), {}):
+            return
+    sync_all_repositories(
+        organization_name=args.organization,
+        triage=TriageQueue(args.triage),
+        scheduler=load_scheduler(args, key=fork_key),
+        only=only,
+        limiter=RateLimiter(args.requests_per_second),
+        concurrency=args.concurrency,
+        index=ReconciliationIndex(args.index) if args.index else None,
+        catalog_path=args.catalog,
+    )
+
+
+def cli_reconcile(args: argparse.Namespace):
+    index = ReconciliationIndex(args.index)
+    organization = load_github().get_organization(args.organization)
+    print(f"Reconciling the forks in {organization.login} with their upstreams ...")
+    changes = index.refresh(organization)
+    index.save()
+    for change in changes:
+        print(f"\t{change}")
+    deleted = sum(1 for link in index if link.upstream is None)
+    print(f"🎉 {len(index)} forks, {len(changes)} changes, {deleted} upstreams deleted")
+
+
+def cli_list_triage(args: argparse.Namespace):
+    print_triage_queue(TriageQueue(args.triage))
+
+
+def cli_retry_triage(args: argparse.Namespace):
+    triage = TriageQueue(args.triage)
+    names = args.repositories or sorted(triage.entries())
+    g = load_github()
+    limiter = RateLimiter(args.requests_per_second)
+    print(f"Retrying {len(names)} repositories ...")
+    # Forks deleted since they were queued can't be synced, they're kept in the queue with their own outcome
+    unresolved: list[SyncOutcome] = []
+
+    def resolve_repositories() -> Generator[RepositoryRecord, None, None]:
+        for name in names:
+            try:
+                yield RepositoryRecord.from_repository(limiter.call(g.get_repo, f"{args.organization}/{name}"))
+            except Exception as e:
+                outcome = SyncOutcome(name, FAILED, f"Couldn't load the fork: {e}")
+                print(f"\t{name}: {outcome.outcome}")
+                unresolved.append(outcome)
+                triage.record(outcome)
+
+    outcomes = sync_in_bulk(
+        resolve_repositories(),
+        limiter,
+        triage,
+        after_sync=configure_record_after_fork,
+        concurrency=args.concurrency,
+        index=ReconciliationIndex(args.index) if args.index else None,
+    )
+    print_sync_report(outcomes + unresolved, triage)
+
+
+def cli_reset_triage(args: argparse.Namespace):
+    triage = TriageQueue(args.triage)
+    index = ReconciliationIndex(args.index) if args.index else None
+    g = load_github()
+    limiter = RateLimiter(args.requests_per_second)
+    for name in args.repositories:
+        full_name = f"{args.organization}/{name}"
+        if index is not None and index.is_deleted(full_name):
+            print(f"Skipping {full_name}, its upstream was deleted so there's nothing to reset it to.")
+            continue
+        print(f"Resetting {full_name} to its upstream ...")
+        try:
+            sha = force_reset(g, full_name, limiter)
+        except (GithubException, ValueError) as e:
+            print(f"\tFailed to reset {full_name}: {e}")
+            continue
+        print(f"\tReset to {sha}")
+        try:
+            record = RepositoryRecord.from_repository(limiter.call(g.get_repo, full_name))
+        except GithubException as e:
+            print(f"\tFailed to load {full_name} after resetting it: {e}")
+            continue
+        triage.record(sync_one(record, limiter, configure_record_after_fork, index))
+        triage.save()
+
+
+def cli_drop_triage(args: argparse.Namespace):
+    triage = TriageQueue(args.triage)
+    for name in args.repositories:
+        triage.remove(name)
+    triage.save()
+
+
+def cli_serve(args: argparse.Namespace):
+    limiter = RateLimiter(args.requests_per_second)
+    index = ReconciliationIndex(args.index) if args.index else None
+    daemon = SyncDaemon(
+        load_github(),
+        args.organization,
+        sync=lambda record: sync_one(record, limiter, configure_record_after_fork, index),
+        triage=TriageQueue(args.triage),
+        scheduler=load_scheduler(args, key=fork_key),
+        limiter=limiter,
+        poll_interval=args.poll_interval,
+        inventory_interval=args.inventory_interval,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        sync_on_start=args.sync_on_start,
+        index=index,
+    )
+    daemon.run(host=args.host, port=args.port)
 
 
 def cli_fork_wolfi_repositories(args: argparse.Namespace):
+    repository_names = read_repository_names(args.repositories)
+    if args.plan or args.budget is not None:
+        costs = load_cost_model(args)
+        if args.catalog:
+            with RepositoryCatalog(args.catalog) as catalog:
+                plan = plan_fork(repository_names, catalog, costs)
+        else:
+            print("No catalog given, assuming every repository needs to be forked ...")
+            plan = plan_fork(repository_names, None, costs)
+        names = {fork_repository_name(name): name for name in repository_names}
+        if not check_plan(args, plan, costs, Path(args.repositories.name), names):
+            return
     fork_wolfi_repositories(
         organization_name=args.organization,
-        repository_file=args.repositories
+        repository_names=repository_names,
+        scheduler=load_scheduler(args, key=upstream_key),
+        mirror_store=MirrorStore(args.mirror_directory, parse_size(args.mirror_max_size))
+        if args.mirror_directory else None,
+        index=ReconciliationIndex(args.index) if args.index else None
     )
 
 
+def cli_build_catalog(args: argparse.Namespace):
+    if args.update and args.output.exists():
+        with RepositoryCatalog(args.output) as catalog:
+            builder = CatalogBuilder.from_catalog(catalog)
+    else:
+        builder = CatalogBuilder()
+    for repository_names in args.repository_names:
+        with repository_names:
+            import_repository_names(builder, repository_names)
+    if args.languages:
+        with args.languages:
+            import_repository_languages(builder, args.languages)
+    builder.write(args.output)
+    print(f"Wrote {len(builder)} repositories to {args.output}")
+
+
+def cli_export_catalog(args: argparse.Namespace):
+    with RepositoryCatalog(args.catalog) as catalog:
+        if args.repository_names:
+            with args.repository_names:
+                export_repository_names(catalog, args.repository_names)
+        if args.languages:
+            with args.languages:
+                export_repository_languages(catalog, args.languages)
+
+
+def cli_show_catalog(args: argparse.Namespace):
+    with RepositoryCatalog(args.catalog) as catalog:
+        record = catalog.get(args.repository) or catalog.get_by_fork(args.repository)
+        if record is None:
+            print(f"{args.repository} is not in {args.catalog}")
+            return
+        print(f"Upstream: {record.upstream}")
+        print(f"Fork: {record.fork}")
+        print(f"Default setup: {record.default_setup}")
+        print(f"Last synced SHA: {record.last_synced_sha}")
+        print("Languages:")
+        for language, size in record.languages.items():
+            print(f"\t{language}: {size}")
+
+
+def cli_enable_code_scanning(args: argparse.Namespace):
+    g = load_github()
+    limiter = RateLimiter(args.requests_per_second)
+    if args.catalog:
+        with RepositoryCatalog(args.catalog) as catalog:
+            candidates = list(candidates_from_catalog(g, catalog, args.minimum_coverage, args.organization))
+    else:
+        organization = g.get_organization(args.organization)
+        candidates = candidates_from_organization(organization, limiter, args.minimum_coverage, args.concurrency)
+
+    results = enable_default_setup_in_bulk(
+        candidates,
+        limiter,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        poll_interval=args.poll_interval,
+        poll_timeout=args.poll_timeout,
+    )
+    print_default_setup_report(results)
+
+    if args.catalog:
+        with RepositoryCatalog(args.catalog) as catalog:
+            builder = CatalogBuilder.from_catalog(catalog)
+            configured = [catalog.get_by_fork(result.name) for result in results if result.state == "configured"]
+            for record in configured:
+                builder.entry(record.upstream).default_setup = "configured"
+        builder.write(args.catalog)
+
+
+def cli_alerts_report(args: argparse.Namespace):
+    # numpy is only needed for the analytics, so it's not required to run the rest of the CLI
+    from oss_security_assessments.alerts import AlertFrame, print_alert_delta_report, print_alert_report
+
+    frame = AlertFrame.load(args.export)
+    if args.compare:
+        print_alert_delta_report(frame, AlertFrame.load(args.compare), top=args.top, state=args.state)
+    else:
+        print_alert_report(frame, top=args.top, state=args.state)
+
+
+def cli_alert_clusters(args: argparse.Namespace):
+    index = FingerprintIndex(iter_alert_export(args.export))
+    print_clusters(index.largest(args.minimum_size, args.state), top=args.top, state=args.state)
+
+
+def cli_alert_cluster(args: argparse.Namespace):
+    print_cluster(FingerprintIndex(iter_alert_export(args.export)).find(args.fingerprint))
+
+
+def cli_dismiss_alert_cluster(args: argparse.Namespace):
+    cluster = FingerprintIndex(iter_alert_export(args.export)).find(args.fingerprint)
+    open_alerts = cluster.in_state('open')
+    repositories = sorted({alert.repository for alert in open_alerts})
+    print(f"Dismissing {len(open_alerts)} open alerts of {cluster.rule} in {cluster.path} "
+          f"across {len(repositories)} repositories:")
+    for repository in repositories:
+        print(f"\t{repository}")
+    outcome = dismiss_cluster(
+        load_github(),
+        cluster,
+        reason=args.reason,
+        comment=args.comment,
+        limiter=RateLimiter(args.requests_per_second),
+        concurrency=args.concurrency,
+    )
+    print(f"🎉 Dismissed {len(outcome['dismissed'])} alerts, {len(outcome['failed'])} failed")
+
+
 def cli():
     load_dotenv()
     # Read in command line arguments
@@ -237,14 +716,391 @@ def cli():
             default="Chainguard-Wolfi-Bites-Back",
         )
 
+    def add_index_argument(sub_parser: argparse.ArgumentParser, **kwargs):
+        sub_parser.add_argument(
+            "--index",
+            help="The JSON file mapping forks to their upstreams by node ID, refreshed with `reconcile`",
+            type=Path,
+            **kwargs,
+        )
+
+    def add_scheduling_arguments(sub_parser: argparse.ArgumentParser):
+        sub_parser.add_argument(
+            "--priority-weights",
+            help="Comma separated weights for the scheduling signals, "
+                 "eg. `activity=1,stars=1,language_coverage=1,staleness=1,failures=1`",
+        )
+        sub_parser.add_argument(
+            "--history",
+            help="A JSON file recording the last sync and failures of each repository, used for scheduling",
+            type=Path,
+        )
+        sub_parser.add_argument(
+            "--languages",
+            help="The `repository_languages.json` file written by `scripts/pull_languages.py`",
+            type=Path,
+        )
+        sub_parser.add_argument(
+            "--catalog",
+            help="A repository catalog built with `catalog build`, used for the language coverage. "
+                 "`sync` records the SHA each fork was synced to in it",
+            type=Path,
+        )
+
     add_default_arguments(fork_parser)
     add_default_arguments(sync_parser)
+    add_scheduling_arguments(fork_parser)
+    add_scheduling_arguments(sync_parser)
+
+    def add_plan_arguments(sub_parser: argparse.ArgumentParser):
+        sub_parser.add_argument(
+            "--plan",
+            help="Print what the run would do, how many requests it would cost and how long it would take, "
+                 "without changing anything. Uses the inventory in --catalog when given",
+            action="store_true",
+        )
+        sub_parser.add_argument(
+            "--budget",
+            help="Refuse to start a run that would need more core API requests than this",
+            type=int,
+        )
+        sub_parser.add_argument(
+            "--shard",
+            help="Instead of refusing a run over --budget, write files splitting it into runs within budget",
+            action="store_true",
+        )
+        sub_parser.add_argument(
+            "--workflows-per-repository",
+            help="The average number of workflows disabled in each repository, used for the estimates",
+            type=float,
+            default=4,
+        )
+
+    add_plan_arguments(fork_parser)
+    add_index_argument(fork_parser)
+    add_plan_arguments(sync_parser)
+    def add_triage_arguments(sub_parser: argparse.ArgumentParser):
+        sub_parser.add_argument(
+            "--triage",
+            help="The JSON file holding the forks that failed to sync",
+            type=Path,
+            default=Path("sync_triage.json"),
+        )
+
+    def add_concurrency_arguments(sub_parser: argparse.ArgumentParser):
+        sub_parser.add_argument(
+            "--concurrency",
+            help="The maximum number of forks synced at the same time",
+            type=int,
+            default=4,
+        )
+        add_request_rate_argument(sub_parser)
 
+    def add_request_rate_argument(sub_parser: argparse.ArgumentParser):
+        sub_parser.add_argument(
+            "--requests-per-second",
+            help="The maximum rate of merge-upstream requests across all workers",
+            type=float,
+            default=1.0,
+        )
+
+    add_triage_arguments(sync_parser)
+    add_concurrency_arguments(sync_parser)
+    add_index_argument(sync_parser)
+    sync_parser.add_argument(
+        "--only",
+        help="A file with the names of the forks to sync, one per line, like the shards written by --shard",
+        type=argparse.FileType('r'),
+    )
+
+    serve_parser = subparser.add_parser(
+        "serve",
+        help="Keep the forks in an organization in sync with their upstreams as they change"
+    )
+    serve_parser.set_defaults(func=cli_serve)
+    add_default_arguments(serve_parser)
+    add_scheduling_arguments(serve_parser)
+    add_triage_arguments(serve_parser)
+    add_index_argument(serve_parser)
+    serve_parser.add_argument(
+        "--host",
+        help="The address to serve `/healthz` and `/metrics` on",
+        default="127.0.0.1",
+    )
+    serve_parser.add_argument(
+        "--port",
+        help="The port to serve `/healthz` and `/metrics` on",
+        type=int,
+        default=8000,
+    )
+    serve_parser.add_argument(
+        "--poll-interval",
+        help="Seconds between polls of the upstreams",
+        type=float,
+        default=300,
+    )
+    serve_parser.add_argument(
+        "--inventory-interval",
+        help="Seconds between listings of the organization's forks",
+        type=float,
+        default=3600,
+    )
+    serve_parser.add_argument(
+        "--batch-size",
+        help="The number of upstreams queried per GraphQL request",
+        type=int,
+        default=50,
+    )
+    serve_parser.add_argument(
+        "--workers",
+        help="The number of forks synced at the same time",
+        type=int,
+        default=1,
+    )
+    serve_parser.add_argument(
+        "--requests-per-second",
+        help="The maximum rate of GraphQL and merge-upstream requests",
+        type=float,
+        default=1.0,
+    )
+    serve_parser.add_argument(
+        "--sync-on-start",
+        help="Sync every fork once at start up instead of only the ones behind or whose upstream changes",
+        action="store_true",
+    )
+
+    fork_parser.add_argument(
+        "--mirror-directory",
+        help="Keep shallow clones of the forks in this directory and check their contents locally instead of "
+             "with the contents API",
+        type=Path,
+    )
+    fork_parser.add_argument(
+        "--mirror-max-size",
+        help="The maximum size of the mirror directory, eg. `500M` or `5G`",
+        default="5G",
+    )
     fork_parser.add_argument(
         "repositories",
         help="The file containing a list of the repositories to fork",
         type=argparse.FileType('r')
     )
+
+    reconcile_parser = subparser.add_parser(
+        "reconcile",
+        help="Refresh the mapping between forks and upstreams, reporting renamed, transferred and deleted upstreams"
+    )
+    reconcile_parser.set_defaults(func=cli_reconcile)
+    add_default_arguments(reconcile_parser)
+    add_index_argument(reconcile_parser, default=Path("repository_index.json"))
+
+    triage_parser = subparser.add_parser("triage", help="Manage the forks that failed to sync")
+    triage_subparser = triage_parser.add_subparsers(required=True)
+    triage_list_parser = triage_subparser.add_parser("list", help="List the forks waiting in the triage queue")
+    triage_list_parser.set_defaults(func=cli_list_triage)
+    add_triage_arguments(triage_list_parser)
+    triage_retry_parser = triage_subparser.add_parser("retry", help="Try to sync the forks in the triage queue again")
+    triage_retry_parser.set_defaults(func=cli_retry_triage)
+    triage_reset_parser = triage_subparser.add_parser(
+        "reset",
+        help="Force the default branch of forks to their upstream's, discarding the forks' own commits"
+    )
+    triage_reset_parser.set_defaults(func=cli_reset_triage)
+    triage_drop_parser = triage_subparser.add_parser("drop", help="Remove forks from the triage queue")
+    triage_drop_parser.set_defaults(func=cli_drop_triage)
+    add_triage_arguments(triage_drop_parser)
+    triage_drop_parser.add_argument("repositories", help="The names of the forks", nargs="+")
+    for triage_action_parser in (triage_retry_parser, triage_reset_parser):
+        add_default_arguments(triage_action_parser)
+        add_triage_arguments(triage_action_parser)
+        add_index_argument(triage_action_parser)
+    add_concurrency_arguments(triage_retry_parser)
+    add_request_rate_argument(triage_reset_parser)
+    triage_retry_parser.add_argument(
+        "repositories",
+        help="The names of the forks, every fork in the queue when none are given",
+        nargs="*",
+    )
+    triage_reset_parser.add_argument("repositories", help="The names of the forks", nargs="+")
+
+    catalog_parser = subparser.add_parser("catalog", help="Build and query the compact repository catalog")
+    catalog_subparser = catalog_parser.add_subparsers(required=True)
+    catalog_build_parser = catalog_subparser.add_parser(
+        "build",
+        help="Build a catalog from repository name lists and `repository_languages.json`"
+    )
+    catalog_build_parser.set_defaults(func=cli_build_catalog)
+    catalog_build_parser.add_argument(
+        "--output",
+        help="The catalog file to write",
+        type=Path,
+        default=Path("repository_catalog.bin"),
+    )
+    catalog_build_parser.add_argument(
+        "--update",
+        help="Start from the existing catalog instead of an empty one",
+        action="store_true",
+    )
+    catalog_build_parser.add_argument(
+        "--repository-names",
+        help="A file with one upstream `owner/name` per line, can be repeated",
+        type=argparse.FileType('r'),
+        action="append",
+        default=[],
+    )
+    catalog_build_parser.add_argument(
+        "--languages",
+        help="The `repository_languages.json` file written by `scripts/pull_languages.py`",
+        type=argparse.FileType('r'),
+    )
+    catalog_export_parser = catalog_subparser.add_parser("export", help="Export a catalog to the text and JSON files")
+    catalog_export_parser.set_defaults(func=cli_export_catalog)
+    catalog_export_parser.add_argument("catalog", help="The catalog file to read", type=Path)
+    catalog_export_parser.add_argument(
+        "--repository-names",
+        help="Write the upstream `owner/name` of every repository to this file",
+        type=argparse.FileType('w'),
+    )
+    catalog_export_parser.add_argument(
+        "--languages",
+        help="Write the forks in the format of `repository_languages.json` to this file",
+        type=argparse.FileType('w'),
+    )
+    catalog_show_parser = catalog_subparser.add_parser("show", help="Show a single repository in the catalog")
+    catalog_show_parser.set_defaults(func=cli_show_catalog)
+    catalog_show_parser.add_argument("catalog", help="The catalog file to read", type=Path)
+    catalog_show_parser.add_argument("repository", help="The upstream `owner/name` or the fork's full name")
+
+    code_scanning_parser = subparser.add_parser("code-scanning", help="Manage code scanning across the forks")
+    code_scanning_subparser = code_scanning_parser.add_subparsers(required=True)
+    code_scanning_enable_parser = code_scanning_subparser.add_parser(
+        "enable",
+        help="Enable code scanning default setup on every fork with languages CodeQL supports"
+    )
+    code_scanning_enable_parser.set_defaults(func=cli_enable_code_scanning)
+    add_default_arguments(code_scanning_enable_parser)
+    code_scanning_enable_parser.add_argument(
+        "--catalog",
+        help="Select the forks from this catalog instead of listing the organization, "
+             "the catalog is updated with the repositories that end up configured",
+        type=Path,
+    )
+    code_scanning_enable_parser.add_argument(
+        "--minimum-coverage",
+        help="The minimum fraction of code in languages CodeQL supports for a fork to be eligible",
+        type=float,
+        default=0.1,
+    )
+    code_scanning_enable_parser.add_argument(
+        "--concurrency",
+        help="The maximum number of requests in flight",
+        type=int,
+        default=4,
+    )
+    code_scanning_enable_parser.add_argument(
+        "--requests-per-second",
+        help="The maximum rate of requests across all workers",
+        type=float,
+        default=1.0,
+    )
+    code_scanning_enable_parser.add_argument(
+        "--batch-size",
+        help="The number of pending setups polled per batch",
+        type=int,
+        default=50,
+    )
+    code_scanning_enable_parser.add_argument(
+        "--poll-interval",
+        help="Seconds to wait between polling the pending setups",
+        type=float,
+        default=15,
+    )
+    code_scanning_enable_parser.add_argument(
+        "--poll-timeout",
+        help="Seconds to wait for the pending setups before reporting them as pending",
+        type=float,
+        default=900,
+    )
+
+    alerts_parser = subparser.add_parser("alerts", help="Analyze exported code scanning alerts")
+    alerts_subparser = alerts_parser.add_subparsers(required=True)
+    alerts_report_parser = alerts_subparser.add_parser(
+        "report",
+        help="Summarize the `code_scanning_alerts.json` written by `scripts/code_scanning_puller2.py`"
+    )
+    alerts_report_parser.set_defaults(func=cli_alerts_report)
+    alerts_report_parser.add_argument("export", help="The exported alerts", type=Path)
+    alerts_report_parser.add_argument(
+        "--compare",
+        help="An earlier export, report the changes since it instead",
+        type=Path,
+    )
+    alerts_report_parser.add_argument(
+        "--state",
+        help="Only include alerts in this state, eg. `open`",
+    )
+    alerts_report_parser.add_argument(
+        "--top",
+        help="The number of rules, projects and repositories to list",
+        type=int,
+        default=10,
+    )
+
+    def add_cluster_arguments(sub_parser: argparse.ArgumentParser):
+        sub_parser.add_argument("export", help="The exported alerts", type=Path)
+        sub_parser.add_argument("fingerprint", help="The cluster's fingerprint, or a unique prefix of it")
+
+    alerts_clusters_parser = alerts_subparser.add_parser(
+        "clusters",
+        help="List the clusters of alerts that are the same finding in different repositories"
+    )
+    alerts_clusters_parser.set_defaults(func=cli_alert_clusters)
+    alerts_clusters_parser.add_argument("export", help="The exported alerts", type=Path)
+    alerts_clusters_parser.add_argument(
+        "--minimum-size",
+        help="Only list clusters with at least this many alerts",
+        type=int,
+        default=2,
+    )
+    alerts_clusters_parser.add_argument(
+        "--state",
+        help="Only count alerts in this state, eg. `open`",
+    )
+    alerts_clusters_parser.add_argument(
+        "--top",
+        help="The number of clusters to list",
+        type=int,
+        default=20,
+    )
+    alerts_cluster_parser = alerts_subparser.add_parser("cluster", help="Show every alert in a cluster")
+    alerts_cluster_parser.set_defaults(func=cli_alert_cluster)
+    add_cluster_arguments(alerts_cluster_parser)
+    alerts_dismiss_parser = alerts_subparser.add_parser(
+        "dismiss",
+        help="Dismiss every open alert in a cluster"
+    )
+    alerts_dismiss_parser.set_defaults(func=cli_dismiss_alert_cluster)
+    add_cluster_arguments(alerts_dismiss_parser)
+    alerts_dismiss_parser.add_argument(
+        "--reason",
+        help="The reason the alerts are dismissed",
+        choices=DISMISSED_REASONS,
+        required=True,
+    )
+    alerts_dismiss_parser.add_argument("--comment", help="A comment recorded with the dismissal")
+    alerts_dismiss_parser.add_argument(
+        "--concurrency",
+        help="The maximum number of requests in flight",
+        type=int,
+        default=4,
+    )
+    alerts_dismiss_parser.add_argument(
+        "--requests-per-second",
+        help="The maximum rate of requests across all workers",
+        type=float,
+        default=1.0,
+    )
+
     args = parser.parse_args()
 
     args.func(args)
@@ -0,0 +1,194 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from time import monotonic, sleep
+from typing import Iterable, Iterator, Optional, Union
+
+from github import Github
+from github.Organization import Organization
+from github.Repository import Repository
+
+from oss_security_assessments.catalog import RepositoryCatalog
+from oss_security_assessments.languages import codeql_coverage, codeql_language_ids
+from oss_security_assessments.rate_limit import RateLimiter
+from oss_security_assessments.records import RepositoryRecord, iter_pages
+from oss_security_assessments.util import bounded_map, error_message
+
+
+@dataclass
+class DefaultSetupCandidate:
+    """A fork that should have code scanning default setup enabled."""
+    name: str
+    # Only the requester and the url are used, so a lazy repository or a record is enough
+    repository: Union[Repository, RepositoryRecord]
+    languages: list[str]
+
+
+@dataclass
+class DefaultSetupResult:
+    name: str
+    # One of `configured`, `not-configured`, `pending` or `failed`
+    state: str
+    languages: list[str] = field(default_factory=list)
+    message: Optional[str] = None
+    run_url: Optional[str] = None
+
+
+def _is_eligible(languages: dict[str, int], default_setup: str, minimum_coverage: float) -> bool:
+    if default_setup == "configured":
+        return False
+    return bool(codeql_language_ids(languages)) and codeql_coverage(languages) >= minimum_coverage
+
+
+def candidates_from_catalog(
+        github: Github,
+        catalog: RepositoryCatalog,
+        minimum_coverage: float,
+        organization: Optional[str] = None
+) -> Iterator[DefaultSetupCandidate]:
+    """Select eligible forks from the catalog, only those in `organization` if given, without making any API calls."""
+    prefix = f"{organization}/".lower() if organization is not None else ""
+    for record in catalog:
+        if record.fork is None or not record.fork.lower().startswith(prefix):
+            continue
+        languages = record.languages
+        if not _is_eligible(languages, record.default_setup, minimum_coverage):
+            continue
+        yield DefaultSetupCandidate(
+            name=record.fork,
+            repository=github.get_repo(record.fork, lazy=True),
+            languages=codeql_language_ids(languages),
+        )
+
+
+def candidates_from_organization(
+        organization: Organization,
+        limiter: RateLimiter,
+        minimum_coverage: float,
+        concurrency: int
+) -> list[DefaultSetupCandidate]:
+    """Select eligible forks by listing the organization, fetching the languages and state of each concurrently."""
+
+    def inspect(repository: Repository) -> Optional[DefaultSetupCandidate]:
+        try:
+            languages = limiter.call(repository.get_languages)
+            _, state = limiter.call(
+                repository._requester.requestJsonAndCheck, "GET", f"{repository.url}/code-scanning/default-setup"
+            )
+        except Exception as e:
+            # One repository that can't be inspected, even over a dropped connection, shouldn't end the listing
+            print(f"\tSkipping {repository.full_name}: {error_message(e)}")
+            return None
+        if not _is_eligible(languages, state.get('state', 'unknown'), minimum_coverage):
+            return None
+        return DefaultSetupCandidate(
+            name=repository.full_name,
+            repository=RepositoryRecord.from_repository(repository),
+            languages=codeql_language_ids(languages),
+        )
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        candidates = bounded_map(executor, inspect, iter_pages(organization.get_repos()), window=2 * concurrency)
+        return [candidate for candidate in candidates if candidate]
+
+
+def enable_default_setup(candidate: DefaultSetupCandidate, limiter: RateLimiter) -> DefaultSetupResult:
+    """Request that code scanning default setup be configured, the setup itself runs asynchronously."""
+    repository = candidate.repository
+    try:
+        _, data = limiter.call(
+            repository._requester.requestJsonAndCheck,
+            "PATCH",
+            f"{repository.url}/code-scanning/default-setup",
+            input={
+                "state": "configured",
+                "query_suite": "default",
+                "languages": candidate.languages,
+            }
+        )
+    except Exception as e:
+        return DefaultSetupResult(
+            name=candidate.name,
+            state="failed",
+            languages=candidate.languages,
+            message=error_message(e),
+        )
+    return DefaultSetupResult(
+        name=candidate.name,
+        state="pending",
+        languages=candidate.languages,
+        run_url=(data or {}).get('run_url'),
+    )
+
+
+def poll_default_setup(
+        candidate: DefaultSetupCandidate,
+        result: DefaultSetupResult,
+        limiter: RateLimiter
+) -> DefaultSetupResult:
+    """Check a pending setup once, leaving it pending if its run hasn't completed yet."""
+    requester = candidate.repository._requester
+    try:
+        if result.run_url:
+            _, run = limiter.call(requester.requestJsonAndCheck, "GET", result.run_url)
+            if run.get('status') != "completed":
+                return result
+            if run.get('conclusion') != "success":
+                result.state = "failed"
+                result.message = f"Setup run concluded with `{run.get('conclusion')}`"
+                return result
+        _, state = limiter.call(
+            requester.requestJsonAndCheck, "GET", f"{candidate.repository.url}/code-scanning/default-setup"
+        )
+    except Exception as e:
+        result.state = "failed"
+        result.message = error_message(e)
+        return result
+    if state.get('state') == "configured":
+        result.state = "configured"
+    elif not result.run_url:
+        # Without a run to wait on, the state is all there is to go by
+        result.state = state.get('state', 'not-configured')
+    return result
+
+
+def enable_default_setup_in_bulk(
+        candidates: Iterable[DefaultSetupCandidate],
+        limiter: RateLimiter,
+        concurrency: int = 4,
+        batch_size: int = 50,
+        poll_interval: float = 15,
+        poll_timeout: float = 900,
+) -> list[DefaultSetupResult]:
+    """
+    Enable default setup on every candidate with at most `concurrency` requests in flight,
+    then poll the pending setups in batches until they finish or `poll_timeout` seconds pass.
+    """
+    candidates = list(candidates)
+    print(f"Enabling code scanning default setup on {len(candidates)} repositories ...")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda candidate: enable_default_setup(candidate, limiter), candidates))
+
+        deadline = monotonic() + poll_timeout
+        pending = [(candidate, result) for candidate, result in zip(candidates, results) if result.state == "pending"]
+        while pending and monotonic() < deadline:
+            print(f"Waiting on {len(pending)} default setup runs ...")
+            sleep(poll_interval)
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                list(executor.map(lambda item: poll_default_setup(item[0], item[1], limiter), batch))
+            pending = [(candidate, result) for candidate, result in pending if result.state == "pending"]
+    return results
+
+
+def print_default_setup_report(results: list[DefaultSetupResult]):
+    by_state: dict[str, list[DefaultSetupResult]] = {}
+    for result in results:
+        by_state.setdefault(result.state, []).append(result)
+    print("🎉 Code scanning default setup report:")
+    for state in sorted(by_state):
+        print(f"\t{state}: {len(by_state[state])}")
+    for state in sorted(by_state):
+        print(f"{state.capitalize()}:")
+        for result in sorted(by_state[state], key=lambda r: r.name):
+            languages = f" ({', '.join(result.languages)})" if result.languages else ""
+            print(f"\t{result.name}{languages}" + (f": {result.message}" if result.message else ""))
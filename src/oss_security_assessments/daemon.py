@@ -0,0 +1,369 @@
+"""
+A long-running process that keeps the forks in an organization within minutes of their upstreams.
+
+The GitHub client and the organization's inventory are kept warm between polls. Upstream default branch heads are
+polled with batched GraphQL queries along with the forks' own heads, and only the forks whose upstream moved, or that
+are behind their upstream when first seen, are queued to be synced.
+"""
+import json
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic
+from typing import Callable, Optional
+
+from github import Github
+from github.Organization import Organization
+
+from oss_security_assessments.bulk_sync import SyncOutcome, TriageQueue
+from oss_security_assessments.rate_limit import RateLimiter
+from oss_security_assessments.reconcile import ReconciliationIndex
+from oss_security_assessments.records import RepositoryRecord, iter_pages
+from oss_security_assessments.scheduler import RepositoryScheduler, UpstreamActivity, fork_key
+from oss_security_assessments.util import error_message, upstream_repository_name
+
+
+@dataclass
+class DaemonMetrics:
+    polls: int = 0
+    poll_errors: int = 0
+    upstream_changes: int = 0
+    upstreams_missing: int = 0
+    syncs_succeeded: int = 0
+    syncs_failed: int = 0
+    sync_errors: int = 0
+    graphql_cost: int = 0
+    inventory_size: int = 0
+    queue_depth: int = 0
+    last_poll: Optional[datetime] = None
+    sync_outcomes: dict[str, int] = field(default_factory=dict)
+
+    def prometheus(self, requests: int) -> str:
+        lines = [
+            f'oss_security_assessments_sync_outcomes_total{{outcome="{outcome}"}} {count}'
+            for outcome, count in sorted(self.sync_outcomes.items())
+        ]
+        for name, value in (
+                ("polls_total", self.polls),
+                ("poll_errors_total", self.poll_errors),
+                ("upstream_changes_total", self.upstream_changes),
+                ("syncs_succeeded_total", self.syncs_succeeded),
+                ("syncs_failed_total", self.syncs_failed),
+                ("sync_errors_total", self.sync_errors),
+                ("graphql_cost_total", self.graphql_cost),
+                ("rest_requests_total", requests),
+                ("upstreams_missing", self.upstreams_missing),
+                ("inventory_size", self.inventory_size),
+                ("queue_depth", self.queue_depth),
+                ("last_poll_timestamp_seconds", self.last_poll.timestamp() if self.last_poll else 0),
+        ):
+            lines.append(f"oss_security_assessments_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _graphql_repository_query(pairs: list[tuple[str, str]]) -> str:
+    """
+    Query the default branch head of each fork as `f<index>` and of its upstream as `u<index>`,
+    along with the upstream's activity the forks are scheduled by.
+    """
+    fields = []
+    for index, (fork, upstream) in enumerate(pairs):
+        for alias, name, selection in (
+                (f"f{index}", fork, "defaultBranchRef { target { oid } }"),
+                (f"u{index}", upstream, "pushedAt stargazerCount defaultBranchRef { target { oid } }"),
+        ):
+            owner, repository = name.split("/", 1)
+            fields.append(
+                f"{alias}: repository(owner: {json.dumps(owner)}, name: {json.dumps(repository)}) {{ {selection} }}"
+            )
+    return "query { " + " ".join(fields) + " rateLimit { cost remaining } }"
+
+
+def _head(repository: Optional[dict]) -> Optional[str]:
+    if repository is None or repository.get('defaultBranchRef') is None:
+        return None
+    return repository['defaultBranchRef']['target']['oid']
+
+
+def _activity(repository: dict) -> UpstreamActivity:
+    pushed_at = repository.get('pushedAt')
+    return UpstreamActivity(
+        pushed_at=datetime.fromisoformat(pushed_at.replace("Z", "+00:00")) if pushed_at else None,
+        stargazers_count=repository.get('stargazerCount') or 0,
+    )
+
+
+class UpstreamWatcher:
+    """
+    Tracks the default branch head of every fork's upstream, reporting the forks whose upstream moved.
+    The upstreams' activity is kept up to date in `upstreams`, keyed by the fork's name.
+    """
+    _heads: dict[str, str]
+
+    def __init__(
+            self,
+            organization: Organization,
+            batch_size: int = 50,
+            index: Optional[ReconciliationIndex] = None,
+            upstreams: Optional[dict[str, UpstreamActivity]] = None
+    ):
+        self._organization = organization
+        self.batch_size = batch_size
+        self.index = index
+        self.upstreams = upstreams if upstreams is not None else {}
+        self._heads = {}
+        self.inventory: dict[str, RepositoryRecord] = {}
+
+    def refresh_inventory(self):
+        """List the organization's forks, keyed by name. The listing is the only paginated call the daemon makes."""
+        self.inventory = {
+            repository.name: RepositoryRecord.from_repository(repository)
+            for repository in iter_pages(self._organization.get_repos(type="forks"))
+        }
+        self._heads = {name: head for name, head in self._heads.items() if name in self.inventory}
+        for name in self.upstreams.keys() - self.inventory.keys():
+            del self.upstreams[name]
+        if self.index is not None:
+            for change in self.index.refresh(self._organization):
+                print(f"\t{change}")
+            self.index.save()
+
+    def upstream(self, name: str) -> Optional[str]:
+        """The current name of a fork's upstream, `None` when it's known to be deleted."""
+        if self.index is not None:
+            link = self.index.by_fork(f"{self._organization.login}/{name}")
+            if link is not None:
+                return link.upstream
+        return upstream_repository_name(name)
+
+    def _query(self, pairs: list[tuple[str, str]]) -> dict:
+        # The requester sends `/graphql` to the API's base URL
+        _, response = self._organization._requester.requestJsonAndCheck(
+            "POST",
+            "/graphql",
+            input={"query": _graphql_repository_query(pairs)}
+        )
+        return response
+
+    def poll(self, metrics: DaemonMetrics, limiter: RateLimiter) -> list[str]:
+        """
+        The names of the forks whose upstream default branch head changed since the previous poll.
+        A fork seen for the first time, after a restart or once it's added to the inventory, is reported when its
+        head differs from its upstream's, so pushes made while the daemon wasn't watching aren't missed.
+        """
+        changed = []
+        # Only kept once every batch succeeded, a failed poll is retried from the same heads so no change is lost
+        heads = {}
+        upstreams = {name: self.upstream(name) for name in self.inventory}
+        # Upstreams known to be deleted aren't worth querying
+        names = sorted(name for name, upstream in upstreams.items() if upstream is not None)
+        missing = len(upstreams) - len(names)
+        for start in range(0, len(names), self.batch_size):
+            batch = names[start:start + self.batch_size]
+            limiter.acquire()
+            response = self._query([(f"{self._organization.login}/{name}", upstreams[name]) for name in batch])
+            data = response.get('data') or {}
+            metrics.graphql_cost += (data.get('rateLimit') or {}).get('cost', 0)
+            for index, name in enumerate(batch):
+                head = _head(data.get(f"u{index}"))
+                if head is None:
+                    missing += 1
+                    continue
+                self.upstreams[name] = _activity(data[f"u{index}"])
+                previous = self._heads.get(name)
+                heads[name] = head
+                if previous is None:
+                    # A fork with commits of its own never matches its upstream, it's only synced once per restart
+                    if _head(data.get(f"f{index}")) != head:
+                        changed.append(name)
+                elif previous != head:
+                    changed.append(name)
+        self._heads.update(heads)
+        metrics.upstreams_missing = missing
+        return changed
+
+
+class SyncDaemon:
+    """Polls the upstreams and syncs the forks whose upstream changed on a pool of worker threads."""
+
+    def __init__(
+            self,
+            github: Github,
+            organization_name: str,
+            sync: Callable[[RepositoryRecord], SyncOutcome],
+            triage: Optional[TriageQueue] = None,
+            scheduler: Optional[RepositoryScheduler[RepositoryRecord]] = None,
+            limiter: Optional[RateLimiter] = None,
+            poll_interval: float = 300,
+            inventory_interval: float = 3600,
+            batch_size: int = 50,
+            workers: int = 1,
+            sync_on_start: bool = False,
+            index: Optional[ReconciliationIndex] = None,
+    ):
+        self.github = github
+        self.organization = github.get_organization(organization_name)
+        self.sync = sync
+        self.triage = triage
+        self.scheduler = scheduler or RepositoryScheduler(key=fork_key)
+        self.limiter = limiter or RateLimiter(1.0)
+        self.poll_interval = poll_interval
+        self.inventory_interval = inventory_interval
+        self.workers = workers
+        self.sync_on_start = sync_on_start
+        self.watcher = UpstreamWatcher(
+            self.organization,
+            batch_size=batch_size,
+            index=index,
+            upstreams=self.scheduler.upstreams
+        )
+        self.metrics = DaemonMetrics()
+        self._queued: set[str] = set()
+        self._condition = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def enqueue(self, name: str):
+        repository = self.watcher.inventory.get(name)
+        if repository is None:
+            return
+        with self._condition:
+            if name in self._queued:
+                return
+            self._queued.add(name)
+            self.scheduler.push(repository)
+            self.metrics.queue_depth = len(self.scheduler)
+            self._condition.notify()
+
+    def _work(self):
+        history = self.scheduler.history
+        while not self._stopping.is_set():
+            with self._condition:
+                while not len(self.scheduler) and not self._stopping.is_set():
+                    self._condition.wait(timeout=1)
+                if self._stopping.is_set():
+                    return
+                repository = self.scheduler.pop()
+                self._queued.discard(repository.name)
+                self.metrics.queue_depth = len(self.scheduler)
+            print(f"Syncing {repository.name} ...")
+            try:
+                outcome = self.sync(repository)
+            except Exception as e:
+                # A worker that dies leaves the queue growing with nothing to drain it
+                print(f"\tSyncing {repository.name} failed: {error_message(e)}")
+                with self._condition:
+                    self.metrics.sync_errors += 1
+                    history.record_failure(repository.name)
+                continue
+            print(f"\t{repository.name}: {outcome.outcome}")
+            with self._condition:
+                outcomes = self.metrics.sync_outcomes
+                outcomes[outcome.outcome] = outcomes.get(outcome.outcome, 0) + 1
+                if outcome.succeeded:
+                    self.metrics.syncs_succeeded += 1
+                    history.record_success(repository.name)
+                else:
+                    self.metrics.syncs_failed += 1
+                    history.record_failure(repository.name)
+                history.save()
+                if self.triage is not None:
+                    self.triage.record(outcome)
+                    self.triage.save()
+
+    def healthy(self) -> bool:
+        """Healthy while every worker is alive and polls keep succeeding, allowing a couple of slow or failed polls."""
+        if any(not thread.is_alive() for thread in self._threads):
+            return False
+        last_poll = self.metrics.last_poll
+        if last_poll is None:
+            return True
+        return (datetime.now(timezone.utc) - last_poll).total_seconds() < 3 * self.poll_interval + 60
+
+    def serve_http(self, host: str, port: int) -> ThreadingHTTPServer:
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/healthz":
+                    healthy = daemon.healthy()
+                    body = json.dumps({
+                        "status": "ok" if healthy else "stale",
+                        "last_poll": daemon.metrics.last_poll.isoformat() if daemon.metrics.last_poll else None,
+                        "inventory_size": daemon.metrics.inventory_size,
+                        "queue_depth": daemon.metrics.queue_depth,
+                        "workers_alive": sum(1 for thread in daemon._threads if thread.is_alive()),
+                    })
+                    self._respond(200 if healthy else 503, "application/json", body)
+                elif self.path == "/metrics":
+                    body = daemon.metrics.prometheus(daemon.limiter.request_count)
+                    self._respond(200, "text/plain; version=0.0.4", body)
+                else:
+                    self._respond(404, "text/plain", "Not Found\n")
+
+            def _respond(self, status: int, content_type: str, body: str):
+                encoded = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                # Health checks would drown out the sync output
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="http", daemon=True).start()
+        print(f"Serving health and metrics on http://{host}:{server.server_port}/")
+        return server
+
+    def stop(self):
+        self._stopping.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    def run(self, host: str = "127.0.0.1", port: int = 8000):
+        server = self.serve_http(host, port)
+        self._threads = [
+            threading.Thread(target=self._work, name=f"sync-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        next_inventory = 0.0
+        first_poll = True
+        try:
+            while not self._stopping.is_set():
+                try:
+                    if monotonic() >= next_inventory:
+                        print(f"Refreshing the inventory of {self.organization.login} ...")
+                        self.watcher.refresh_inventory()
+                        self.metrics.inventory_size = len(self.watcher.inventory)
+                        next_inventory = monotonic() + self.inventory_interval
+                    changed = self.watcher.poll(self.metrics, self.limiter)
+                except Exception as e:
+                    # Neither API errors nor connection errors from `requests` stop the daemon, the next poll retries
+                    print(f"Poll failed: {error_message(e)}")
+                    self.metrics.poll_errors += 1
+                else:
+                    if first_poll and self.sync_on_start:
+                        changed = list(self.watcher.inventory)
+                    first_poll = False
+                    self.metrics.polls += 1
+                    self.metrics.upstream_changes += len(changed)
+                    self.metrics.last_poll = datetime.now(timezone.utc)
+                    if changed:
+                        print(f"{len(changed)} upstreams changed, queueing their forks ...")
+                    for name in changed:
+                        self.enqueue(name)
+                self._stopping.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            print("Stopping ...")
+        finally:
+            self.stop()
+            server.shutdown()
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,199 @@
+"""
+Groups the code scanning alerts that are the same finding in vendored copies of the same code across forks,
+so one triage decision can be applied to every copy.
+
+Only alerts in a vendor directory are grouped across repositories, an alert anywhere else is only grouped with the
+same finding in its own repository.
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from github import Github
+
+from oss_security_assessments.rate_limit import RateLimiter
+from oss_security_assessments.util import error_message
+
+# Directories that hold copies of other projects' code
+VENDOR_DIRECTORIES = frozenset({
+    "vendor",
+    "_vendor",
+    "vendored",
+    "third_party",
+    "third-party",
+    "thirdparty",
+    "3rdparty",
+    "node_modules",
+    "external",
+    "extern",
+    "deps",
+})
+
+DISMISSED_REASONS = ("false positive", "won't fix", "used in tests")
+
+
+def normalize_path(path: str) -> str:
+    """Strip everything up to the innermost vendor directory, so copies of a library share a path."""
+    parts = path.split("/")
+    for index in range(len(parts) - 2, -1, -1):
+        if parts[index].lower() in VENDOR_DIRECTORIES:
+            return "/".join(parts[index + 1:])
+    return path
+
+
+def _snippet_hash(instance: dict) -> str:
+    # Identical copies of a file share both the message and where in the file the finding is
+    text = " ".join(((instance.get('message') or {}).get('text') or "").split())
+    location = instance.get('location') or {}
+    span = ":".join(str(location.get(key, "")) for key in ("start_line", "start_column", "end_line", "end_column"))
+    return hashlib.sha1(f"{text}\0{span}".encode()).hexdigest()
+
+
+def alert_fingerprint(alert: dict) -> tuple[str, str, str, bool]:
+    """
+    The fingerprint of an alert, along with the rule and normalized path it was computed from,
+    and whether the path is in a vendor directory.
+    """
+    instance = alert.get('most_recent_instance') or {}
+    rule = (alert.get('rule') or {}).get('id') or "unknown"
+    original_path = (instance.get('location') or {}).get('path') or ""
+    path = normalize_path(original_path)
+    vendored = path != original_path
+    # A `setup.py` in one project has nothing to do with a `setup.py` in another
+    scope = "" if vendored else (alert.get('repository') or {}).get('full_name', "unknown")
+    digest = hashlib.sha256(f"{rule}\0{path}\0{scope}\0{_snippet_hash(instance)}".encode()).hexdigest()[:16]
+    return digest, rule, path, vendored
+
+
+class AlertReference:
+    """The parts of an alert needed to act on it."""
+    __slots__ = ("repository", "number", "state", "html_url")
+
+    def __init__(self, repository: str, number: int, state: str, html_url: Optional[str]):
+        self.repository = repository
+        self.number = number
+        self.state = state
+        self.html_url = html_url
+
+
+@dataclass
+class AlertCluster:
+    fingerprint: str
+    rule: str
+    path: str
+    vendored: bool = False
+    alerts: list[AlertReference] = field(default_factory=list)
+
+    @property
+    def repositories(self) -> set[str]:
+        return {alert.repository for alert in self.alerts}
+
+    def in_state(self, state: str) -> list[AlertReference]:
+        return [alert for alert in self.alerts if alert.state == state]
+
+
+class FingerprintIndex:
+    """A hash index from fingerprint to the cluster of alerts sharing it, built in one pass over the alerts."""
+    clusters: dict[str, AlertCluster]
+
+    def __init__(self, alerts: Iterable[dict] = ()):
+        self.clusters = {}
+        for alert in alerts:
+            self.add(alert)
+
+    def add(self, alert: dict):
+        fingerprint, rule, path, vendored = alert_fingerprint(alert)
+        cluster = self.clusters.get(fingerprint)
+        if cluster is None:
+            cluster = self.clusters[fingerprint] = AlertCluster(
+                fingerprint=fingerprint,
+                rule=rule,
+                path=path,
+                vendored=vendored,
+            )
+        cluster.alerts.append(AlertReference(
+            repository=(alert.get('repository') or {}).get('full_name', "unknown"),
+            number=alert.get('number', 0),
+            state=alert.get('state') or "unknown",
+            html_url=alert.get('html_url'),
+        ))
+
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    def largest(self, minimum_size: int = 2, state: Optional[str] = None) -> list[AlertCluster]:
+        """The clusters with at least `minimum_size` alerts, counting only alerts in `state` if given."""
+
+        def size(cluster: AlertCluster) -> int:
+            return len(cluster.alerts) if state is None else len(cluster.in_state(state))
+
+        clusters = [cluster for cluster in self.clusters.values() if size(cluster) >= minimum_size]
+        return sorted(clusters, key=size, reverse=True)
+
+    def find(self, fingerprint: str) -> AlertCluster:
+        """Find a cluster by its fingerprint or an unambiguous prefix of it."""
+        if fingerprint in self.clusters:
+            return self.clusters[fingerprint]
+        matches = [key for key in self.clusters if key.startswith(fingerprint)]
+        if len(matches) != 1:
+            raise ValueError(f"{len(matches)} clusters match the fingerprint `{fingerprint}`")
+        return self.clusters[matches[0]]
+
+
+def dismiss_cluster(
+        github: Github,
+        cluster: AlertCluster,
+        reason: str,
+        comment: Optional[str],
+        limiter: RateLimiter,
+        concurrency: int = 4
+) -> dict[str, list[AlertReference]]:
+    """Dismiss every open alert in the cluster, returning the alerts grouped by `dismissed` and `failed`."""
+    if reason not in DISMISSED_REASONS:
+        raise ValueError(f"Unknown dismissed reason `{reason}`, expected one of {', '.join(DISMISSED_REASONS)}")
+    repositories = {name: github.get_repo(name, lazy=True) for name in cluster.repositories}
+    body = {"state": "dismissed", "dismissed_reason": reason}
+    if comment:
+        body["dismissed_comment"] = comment
+
+    def dismiss(alert: AlertReference) -> bool:
+        repository = repositories[alert.repository]
+        try:
+            limiter.call(
+                repository._requester.requestJsonAndCheck,
+                "PATCH",
+                f"{repository.url}/code-scanning/alerts/{alert.number}",
+                input=body
+            )
+        except Exception as e:
+            print(f"\tFailed to dismiss {alert.repository}#{alert.number}: {error_message(e)}")
+            return False
+        alert.state = "dismissed"
+        return True
+
+    alerts = cluster.in_state("open")
+    outcome: dict[str, list[AlertReference]] = {"dismissed": [], "failed": []}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for alert, dismissed in zip(alerts, executor.map(dismiss, alerts)):
+            outcome["dismissed" if dismissed else "failed"].append(alert)
+    return outcome
+
+
+def print_clusters(clusters: list[AlertCluster], top: int = 20, state: Optional[str] = None):
+    print(f"🎉 {len(clusters)} clusters of duplicated alerts")
+    for cluster in clusters[:top]:
+        alerts = cluster.alerts if state is None else cluster.in_state(state)
+        print(f"{cluster.fingerprint}  {len(alerts)} alerts in {len({a.repository for a in alerts})} repositories")
+        print(f"\t{cluster.rule}  {cluster.path}")
+    if len(clusters) > top:
+        print(f"... and {len(clusters) - top} more")
+
+
+def print_cluster(cluster: AlertCluster):
+    print(f"Fingerprint: {cluster.fingerprint}")
+    print(f"Rule: {cluster.rule}")
+    print(f"Path: {cluster.path}{' (vendored)' if cluster.vendored else ''}")
+    print(f"Alerts ({len(cluster.alerts)}):")
+    for alert in sorted(cluster.alerts, key=lambda a: (a.repository, a.number)):
+        print(f"\t[{alert.state}] {alert.html_url or f'{alert.repository}#{alert.number}'}")
@@ -1,17 +1,29 @@
-from dataclasses import dataclass
+from typing import Optional
 
-from github import UnknownObjectException, GithubException
+from github import UnknownObjectException
+from github.GithubException import GithubException
 from github.Repository import Repository
 from selenium import webdriver
 from selenium.common import NoSuchElementException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 
+from oss_security_assessments.mirror import MirrorError, MirrorStore, RepositoryNotFoundError, repository_tree
 from oss_security_assessments.onepassword_wrapper import OnePassword
 
 
-def _is_fork_complete(repository: Repository) -> bool:
+def _is_fork_complete(repository: Repository, mirror_store: Optional[MirrorStore] = None) -> bool:
     """Check if the fork has completed."""
+    if mirror_store is not None:
+        try:
+            # The fork is changing underneath us, so the mirror is always fetched again
+            return bool(repository_tree(mirror_store, repository, max_age=0))
+        except RepositoryNotFoundError:
+            # The repository can't be cloned until the fork has been created
+            return False
+        except MirrorError as e:
+            # Any other failure won't go away by retrying, ask the API instead
+            print(f"\t{e}")
     try:
         repository.get_contents("")
         return True
@@ -25,11 +37,13 @@ def _is_fork_complete(repository: Repository) -> bool:
 class GitHubSelenium:
     """A wrapper over GitHub using selenium to interact with the GitHub website."""
     _one_password: OnePassword
+    _mirror_store: Optional[MirrorStore]
     _d: webdriver.Chrome
     _base_url: str
 
-    def __init__(self, op: OnePassword):
+    def __init__(self, op: OnePassword, mirror_store: Optional[MirrorStore] = None):
         self._one_password = op
+        self._mirror_store = mirror_store
 
     def __enter__(self):
         """Enter the context manager."""
@@ -57,9 +71,14 @@ class GitHubSelenium:
         self._get("sessions/two-factor/app")
         self._find_element_by_id("app_totp").send_keys(op.current_github_otp_value())
 
-    @staticmethod
-    def _has_github_actions(repository: Repository) -> bool:
-        """Look for a GitHub actions directory using a HEAD request to see if it exists."""
+    def _has_github_actions(self, repository: Repository) -> bool:
+        """Look for a GitHub actions directory, in the local mirror if there is one, otherwise using the API."""
+        if self._mirror_store is not None:
+            try:
+                workflows = repository_tree(self._mirror_store, repository, ".github/workflows")
+                return bool(workflows)
+            except MirrorError as e:
+                print(f"\t{e}")
         try:
             workflows_dir = repository.get_contents(".github/workflows")
         except UnknownObjectException:
@@ -87,7 +106,7 @@ class GitHubSelenium:
                     "//*[@id=\"repo-content-pjax-container\"]/div/div/div/div/div/div/form/input[1]"
                 ).click()
             except NoSuchElementException:
-                if not _is_fork_complete(repository):
+                if not _is_fork_complete(repository, self._mirror_store):
                     print("\tFork isn't complete. Retrying ...")
                     continue
                 if not self._has_github_actions(repository):
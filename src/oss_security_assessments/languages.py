@@ -0,0 +1,45 @@
+import json
+from pathlib import Path
+
+# Maps GitHub linguist language names to the language identifiers used by CodeQL default setup.
+# https://docs.github.com/en/rest/code-scanning/code-scanning#update-a-code-scanning-default-setup-configuration
+CODEQL_LANGUAGE_IDS: dict[str, str] = {
+    "C": "c-cpp",
+    "C++": "c-cpp",
+    "C#": "csharp",
+    "Go": "go",
+    "Java": "java-kotlin",
+    "Kotlin": "java-kotlin",
+    "JavaScript": "javascript-typescript",
+    "TypeScript": "javascript-typescript",
+    "Vue": "javascript-typescript",
+    "Python": "python",
+    "Ruby": "ruby",
+    "Swift": "swift",
+}
+
+
+def codeql_coverage(languages: dict[str, int]) -> float:
+    """Fraction of the bytes in a repository written in languages CodeQL can analyze."""
+    total = sum(languages.values())
+    if total == 0:
+        return 0.0
+    covered = sum(size for language, size in languages.items() if language in CODEQL_LANGUAGE_IDS)
+    return covered / total
+
+
+def codeql_language_ids(languages: dict[str, int]) -> list[str]:
+    """The CodeQL default setup language identifiers for a repository's language mix."""
+    return sorted({CODEQL_LANGUAGE_IDS[language] for language in languages if language in CODEQL_LANGUAGE_IDS})
+
+
+def load_repository_languages(path: Path) -> dict[str, dict[str, int]]:
+    """
+    Load the output of `scripts/pull_languages.py`, keyed by the fork's repository name (without the organization).
+    """
+    with open(path) as languages_file:
+        entries = json.load(languages_file)
+    return {
+        entry['repository_name'].split('/', 1)[-1]: entry['languages']
+        for entry in entries
+    }
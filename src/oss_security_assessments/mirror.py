@@ -0,0 +1,196 @@
+"""
+A local store of shallow, blobless clones of the forks, so questions about their contents are answered with
+`git ls-tree` instead of the contents API.
+
+Only the trees of the default branch's head commit are fetched, file contents are never downloaded.
+Disk use is bounded by evicting the least recently used mirrors.
+"""
+import os
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from time import time
+from typing import Optional
+
+from github.Repository import Repository
+
+_SIZE_SUFFIXES = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+# Touched after every clone or fetch, its modification time is when the mirror was last refreshed
+_LAST_FETCH = "oss-last-fetch"
+
+
+def parse_size(value: str) -> int:
+    """Parse a size like `500M` or `5G` into bytes."""
+    value = value.strip().upper().removesuffix("B")
+    if value and value[-1] in _SIZE_SUFFIXES:
+        return int(float(value[:-1]) * _SIZE_SUFFIXES[value[-1]])
+    return int(value)
+
+
+class MirrorError(Exception):
+    """A git command against a mirror failed."""
+
+
+class RepositoryNotFoundError(MirrorError):
+    """The remote repository doesn't exist, or isn't visible with the credentials git has."""
+
+
+# How git and GitHub report a remote that doesn't exist, as opposed to one that can't be reached
+_NOT_FOUND_MESSAGES = (
+    "Repository not found",
+    "does not appear to be a git repository",
+    "' does not exist",
+)
+
+
+def _git(*args: str, cwd: Optional[Path] = None) -> str:
+    try:
+        return subprocess.run(
+            ["git", *args],
+            cwd=cwd,
+            check=True,
+            capture_output=True,
+            text=True,
+            # Never wait on a credentials prompt for a repository that doesn't exist (yet)
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+        ).stdout
+    except FileNotFoundError as e:
+        # git isn't installed, or the mirror was removed underneath us
+        raise MirrorError(f"`git {' '.join(args)}` couldn't be run: {e}") from e
+    except subprocess.CalledProcessError as e:
+        message = f"`git {' '.join(args)}` failed: {e.stderr.strip()}"
+        if any(marker in e.stderr for marker in _NOT_FOUND_MESSAGES):
+            raise RepositoryNotFoundError(message) from e
+        raise MirrorError(message) from e
+
+
+def _directory_size(path: Path) -> int:
+    total = 0
+    for directory, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.lstat(os.path.join(directory, file)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class MirrorStore:
+    """
+    Shallow, blobless, bare clones kept under `root`, one per repository.
+
+    A mirror is fetched again when it's older than `max_age` seconds, and the least recently used mirrors are removed
+    once the store grows past `max_bytes`.
+    The size of the store is measured once when it's opened, after that only the mirror just cloned or fetched is.
+    """
+    _sizes: dict[Path, int]
+    _last_used: dict[Path, float]
+
+    def __init__(self, root: Path, max_bytes: int = 5 << 30, max_age: float = 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        root.mkdir(parents=True, exist_ok=True)
+        mirrors = [path for path in root.glob("*.git") if path.is_dir()]
+        self._sizes = {path: _directory_size(path) for path in mirrors}
+        # The directory's modification time marks when the mirror was last used by an earlier run
+        self._last_used = {path: path.stat().st_mtime for path in mirrors}
+        self._total = sum(self._sizes.values())
+
+    def _measure(self, path: Path):
+        size = _directory_size(path)
+        self._total += size - self._sizes.get(path, 0)
+        self._sizes[path] = size
+
+    def path(self, name: str) -> Path:
+        return self.root / f"{name.replace('/', '__')}.git"
+
+    def _last_fetch(self, path: Path) -> float:
+        try:
+            return (path / _LAST_FETCH).stat().st_mtime
+        except FileNotFoundError:
+            return 0
+
+    def _clone(self, url: str, path: Path):
+        temporary_path = path.with_name(path.name + ".tmp")
+        if temporary_path.exists():
+            # Left behind by an interrupted clone
+            shutil.rmtree(temporary_path)
+        _git("clone", "--quiet", "--bare", "--single-branch", "--depth", "1", "--filter=blob:none", url,
+             str(temporary_path))
+        (temporary_path / _LAST_FETCH).touch()
+        os.replace(temporary_path, path)
+
+    def _fetch(self, path: Path):
+        # Fetching `HEAD` follows the remote's default branch, even if it has been renamed
+        _git("fetch", "--quiet", "--depth", "1", "--filter=blob:none", "origin", "HEAD", cwd=path)
+        _git("update-ref", "HEAD", "FETCH_HEAD", cwd=path)
+        (path / _LAST_FETCH).touch()
+
+    def mirror(self, name: str, url: str, max_age: Optional[float] = None) -> Path:
+        """The path of an up-to-date mirror of the repository, cloning or fetching it as needed."""
+        max_age = self.max_age if max_age is None else max_age
+        path = self.path(name)
+        with self._lock:
+            if not path.exists():
+                self._clone(url, path)
+                self._measure(path)
+            elif time() - self._last_fetch(path) >= max_age:
+                try:
+                    self._fetch(path)
+                except MirrorError as e:
+                    # A remote that is still empty has no `HEAD` to fetch
+                    if "couldn't find remote ref" not in str(e):
+                        raise
+                self._measure(path)
+            os.utime(path)
+            self._last_used[path] = time()
+            if self._total > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _evict(self, keep: Path):
+        for path in sorted(self._last_used, key=self._last_used.get):
+            if self._total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            print(f"\tEvicting the mirror of {path.name} ...")
+            shutil.rmtree(path, ignore_errors=True)
+            self._total -= self._sizes.pop(path, 0)
+            del self._last_used[path]
+
+    def list_tree(
+            self,
+            name: str,
+            url: str,
+            directory: str = "",
+            max_age: Optional[float] = None
+    ) -> Optional[list[str]]:
+        """
+        The names of the entries in a directory of the default branch, or `None` if the directory doesn't exist.
+        An empty repository has an empty root directory.
+        """
+        path = self.mirror(name, url, max_age)
+        try:
+            _git("rev-parse", "--verify", "--quiet", "HEAD^{commit}", cwd=path)
+        except MirrorError:
+            return [] if directory in ("", ".") else None
+        treeish = "HEAD" if directory in ("", ".") else f"HEAD:{directory.strip('/')}"
+        try:
+            output = _git("ls-tree", "--name-only", treeish, cwd=path)
+        except MirrorError:
+            return None
+        return output.splitlines()
+
+
+def repository_tree(
+        store: MirrorStore,
+        repository: Repository,
+        directory: str = "",
+        max_age: Optional[float] = None
+) -> Optional[list[str]]:
+    """List a directory of a GitHub repository from its mirror."""
+    return store.list_tree(repository.full_name, repository.clone_url, directory, max_age)
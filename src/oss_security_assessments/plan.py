@@ -0,0 +1,184 @@
+"""
+Dry runs of `fork` and `sync`: which mutations would happen, how many requests they'd cost and how long they'd take.
+
+The plan is computed from the cached inventory in the repository catalog, so it costs no API calls beyond reading the
+current rate limit, which doesn't count against it.
+"""
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from oss_security_assessments.catalog import RepositoryCatalog
+from oss_security_assessments.util import fork_repository_name
+
+# `fork` and `sync` mostly spend the REST API's rate limit bucket, page loads in the browser are tracked alongside it
+CORE = "core"
+GRAPHQL = "graphql"
+BROWSER = "browser"
+# The REST API returns at most this many repositories per page of an organization's listing
+PAGE_SIZE = 100
+# Repositories per GraphQL query when `sync` reads the upstreams' activity, and the synced SHAs for the catalog
+HEADS_BATCH_SIZE = 50
+RATE_LIMIT_WINDOW = 3600
+
+
+@dataclass
+class CostModel:
+    """The assumptions the estimates are built on, anything the inventory doesn't record is an average."""
+    workflows_per_repository: float = 4
+    seconds_per_request: float = 0.5
+    seconds_per_browser_page: float = 5
+    # Checking the contents of a fork costs nothing when they're answered from a local mirror
+    uses_mirror: bool = False
+
+    def enable_actions(self) -> Counter:
+        return Counter({BROWSER: 1, CORE: 0 if self.uses_mirror else 2})
+
+    def configure(self) -> Counter:
+        # Disable the unused features, list the workflows and disable them one at a time
+        return Counter({CORE: 2 + math.ceil(self.workflows_per_repository)})
+
+
+@dataclass
+class PlannedAction:
+    # One of `fork`, `configure` or `sync`
+    kind: str
+    repository: str
+    requests: Counter
+
+
+@dataclass
+class RateLimitSnapshot:
+    remaining: int
+    limit: int
+    # Seconds until the current window resets
+    reset_in: float
+
+
+@dataclass
+class Plan:
+    actions: list[PlannedAction] = field(default_factory=list)
+    # Requests made up front, like listing the organization, that can't be split between shards
+    overhead: Counter = field(default_factory=Counter)
+
+    def requests(self) -> Counter:
+        total = Counter(self.overhead)
+        for action in self.actions:
+            total.update(action.requests)
+        return total
+
+    def kinds(self) -> Counter:
+        return Counter(action.kind for action in self.actions)
+
+    def runtime(self, costs: CostModel, rate_limit: Optional[RateLimitSnapshot] = None) -> float:
+        """Projected seconds to run the plan, waiting on the rate limit to reset when the quota runs out."""
+        requests = self.requests()
+        runtime = (requests[CORE] + requests[GRAPHQL]) * costs.seconds_per_request \
+            + requests[BROWSER] * costs.seconds_per_browser_page
+        if rate_limit is None or requests[CORE] <= rate_limit.remaining:
+            return runtime
+        windows = math.ceil((requests[CORE] - rate_limit.remaining) / rate_limit.limit)
+        return max(runtime, rate_limit.reset_in + (windows - 1) * RATE_LIMIT_WINDOW)
+
+    def shards(self, budget: int) -> list[list[PlannedAction]]:
+        """Split the actions into runs that each spend at most `budget` core requests, overhead included."""
+        available = budget - self.overhead[CORE]
+        shards: list[list[PlannedAction]] = [[]]
+        spent = 0
+        for action in self.actions:
+            cost = action.requests[CORE]
+            if cost > available:
+                raise ValueError(f"{action.repository} alone needs {cost} requests, more than the budget allows.")
+            if spent + cost > available:
+                shards.append([])
+                spent = 0
+            shards[-1].append(action)
+            spent += cost
+        return [shard for shard in shards if shard]
+
+
+def plan_fork(upstream_names: Iterable[str], catalog: Optional[RepositoryCatalog], costs: CostModel) -> Plan:
+    """
+    Plan forking the upstream repositories. Without a catalog every repository is assumed to need forking,
+    the most expensive case.
+    """
+    plan = Plan()
+    for name in upstream_names:
+        record = catalog.get(name) if catalog is not None else None
+        # Fetch the upstream and look for an existing fork
+        requests = Counter({CORE: 2})
+        if record is not None and record.fork is not None:
+            kind = "configure"
+        else:
+            kind = "fork"
+            requests[CORE] += 1
+        requests.update(costs.enable_actions())
+        requests.update(costs.configure())
+        plan.actions.append(PlannedAction(kind=kind, repository=fork_repository_name(name), requests=requests))
+    return plan
+
+
+def plan_sync(
+        fork_names: Iterable[str],
+        costs: CostModel,
+        listed: bool = True,
+        records_shas: bool = False,
+        listing_size: Optional[int] = None
+) -> Plan:
+    """
+    Plan syncing the forks, `listed` when the run lists the organization to find them
+    and `records_shas` when it reads the synced SHAs back for the catalog.
+    The activity of the upstreams, which orders the forks, is read in batches before syncing.
+    The listing pages through all `listing_size` repositories of the organization, even when only some are synced.
+    """
+    plan = Plan()
+    for name in fork_names:
+        requests = Counter({CORE: 1})
+        requests.update(costs.configure())
+        plan.actions.append(PlannedAction(kind="sync", repository=name, requests=requests))
+    if listed:
+        listing_size = max(listing_size or 0, len(plan.actions))
+        plan.overhead[CORE] = max(math.ceil(listing_size / PAGE_SIZE), 1)
+    batches = math.ceil(len(plan.actions) / HEADS_BATCH_SIZE)
+    if batches:
+        plan.overhead[GRAPHQL] = batches * 2 if records_shas else batches
+    return plan
+
+
+def _format_duration(seconds: float) -> str:
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s"
+
+
+def print_plan(plan: Plan, costs: CostModel, rate_limit: Optional[RateLimitSnapshot], budget: Optional[int]):
+    print("📋 Plan:")
+    for kind, count in sorted(plan.kinds().items()):
+        print(f"\t{kind}: {count} repositories")
+    print("Requests:")
+    for bucket, count in sorted(plan.requests().items()):
+        print(f"\t{bucket}: {count}")
+    if rate_limit is not None:
+        print(f"Quota: {rate_limit.remaining} of {rate_limit.limit} core requests remaining, "
+              f"resetting in {_format_duration(rate_limit.reset_in)}")
+    print(f"Projected runtime: {_format_duration(plan.runtime(costs, rate_limit))}")
+    if budget is not None:
+        verdict = "within" if plan.requests()[CORE] <= budget else "over"
+        print(f"Budget: {budget} core requests, the plan is {verdict} budget")
+
+
+def write_shards(plan: Plan, budget: int, path: Path, names: dict[str, str]) -> list[Path]:
+    """
+    Write one file per shard next to `path`, listing the names the command reads for each planned repository.
+    `names` maps the planned fork name back to the name to write.
+    """
+    paths = []
+    for index, shard in enumerate(plan.shards(budget)):
+        shard_path = path.with_name(f"{path.stem}.shard-{index}{path.suffix or '.txt'}")
+        with open(shard_path, "w") as shard_file:
+            for action in shard:
+                shard_file.write(f"{names.get(action.repository, action.repository)}\n")
+        paths.append(shard_path)
+    return paths
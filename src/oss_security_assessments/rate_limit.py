@@ -0,0 +1,61 @@
+import threading
+from time import monotonic, sleep
+from typing import Callable, TypeVar
+
+from github.GithubException import GithubException
+
+from oss_security_assessments.util import fibonacci
+
+T = TypeVar("T")
+
+
+def is_rate_limited(e: GithubException) -> bool:
+    """Whether the exception is GitHub's primary or secondary rate limit rather than a real failure."""
+    if e.status not in (403, 429):
+        return False
+    message = e.data.get('message', '') if isinstance(e.data, dict) else str(e.data)
+    return "rate limit" in message.lower() or bool(e.headers and "retry-after" in {k.lower() for k in e.headers})
+
+
+class RateLimiter:
+    """
+    Spaces out requests shared between threads so they stay under a number of requests per second,
+    and backs off when GitHub reports that a rate limit was hit anyway.
+    """
+    _interval: float
+    _next_request: float
+    _lock: threading.Lock
+
+    def __init__(self, requests_per_second: float, max_retries: int = 10):
+        if requests_per_second <= 0:
+            raise ValueError("requests_per_second must be positive")
+        self._interval = 1 / requests_per_second
+        self._next_request = monotonic()
+        self._lock = threading.Lock()
+        self.max_retries = max_retries
+        self.request_count = 0
+
+    def acquire(self):
+        """Block until the next request may be made."""
+        with self._lock:
+            now = monotonic()
+            wait = self._next_request - now
+            self._next_request = max(now, self._next_request) + self._interval
+            self.request_count += 1
+        if wait > 0:
+            sleep(wait)
+
+    def call(self, function: Callable[..., T], *args, **kwargs) -> T:
+        retry_count = 0
+        while True:
+            self.acquire()
+            try:
+                return function(*args, **kwargs)
+            except GithubException as e:
+                if not is_rate_limited(e) or retry_count >= self.max_retries:
+                    raise e
+                retry_count += 1
+                retry_after = (e.headers or {}).get("retry-after") or (e.headers or {}).get("Retry-After")
+                sleep_time = int(retry_after) if retry_after else fibonacci(retry_count + 5)
+                print(f"\tRate limited, retrying in {sleep_time} seconds...")
+                sleep(sleep_time)
@@ -0,0 +1,199 @@
+"""
+A persistent, bidirectional mapping between the forks in an organization and their upstreams.
+
+Repositories are keyed by GitHub's node IDs, which survive renames and transfers, so commands can resolve the current
+name of either side locally instead of finding out about a rename from a 404.
+"""
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from github.Organization import Organization
+
+from oss_security_assessments.util import upstream_repository_name
+
+_FORKS_QUERY = """
+query($login: String!, $after: String) {
+  organization(login: $login) {
+    repositories(first: 100, after: $after, isFork: true) {
+      pageInfo { hasNextPage endCursor }
+      nodes { id nameWithOwner parent { id nameWithOwner } }
+    }
+  }
+}
+"""
+
+ADDED = "added"
+REMOVED = "removed"
+RENAMED = "renamed"
+TRANSFERRED = "transferred"
+REPARENTED = "reparented"
+DELETED = "deleted"
+
+
+@dataclass
+class RepositoryLink:
+    fork_id: str
+    fork: str
+    # `None` once the upstream has been deleted
+    upstream_id: Optional[str]
+    upstream: Optional[str]
+    # Every earlier name of the upstream, including the one the fork was named after
+    previous_upstreams: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ReconcileChange:
+    kind: str
+    fork: str
+    before: Optional[str] = None
+    after: Optional[str] = None
+
+    def __str__(self):
+        if self.kind in (RENAMED, TRANSFERRED, REPARENTED):
+            return f"[{self.kind}] {self.fork}: {self.before} -> {self.after}"
+        if self.kind == DELETED:
+            return f"[{self.kind}] {self.fork}: {self.before} no longer exists"
+        return f"[{self.kind}] {self.fork}"
+
+
+def _upstream_change(before: str, after: str) -> str:
+    return TRANSFERRED if before.split("/")[0].lower() != after.split("/")[0].lower() else RENAMED
+
+
+class ReconciliationIndex:
+    """The links between forks and upstreams, persisted as JSON and indexed by name in memory."""
+    _path: Path
+    _links: dict[str, RepositoryLink]
+    _by_upstream: dict[str, RepositoryLink]
+    _by_fork: dict[str, RepositoryLink]
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._links = {}
+        if path.exists():
+            with open(path) as index_file:
+                self._links = {
+                    fork_id: RepositoryLink(**link) for fork_id, link in json.load(index_file).items()
+                }
+        self._reindex()
+
+    def _reindex(self):
+        self._by_fork = {link.fork.lower(): link for link in self._links.values()}
+        self._by_upstream = {}
+        # Earlier names first, so a name that has since been taken by another repository resolves to its current owner
+        for link in self._links.values():
+            names = [*link.previous_upstreams, upstream_repository_name(link.fork)]
+            for name in names:
+                self._by_upstream.setdefault(name.lower(), link)
+        for link in self._links.values():
+            if link.upstream is not None:
+                self._by_upstream[link.upstream.lower()] = link
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    def __iter__(self) -> Iterator[RepositoryLink]:
+        return iter(self._links.values())
+
+    def by_upstream(self, name: str) -> Optional[RepositoryLink]:
+        """Find a link by the current or any earlier name of the upstream."""
+        return self._by_upstream.get(name.lower())
+
+    def by_fork(self, full_name: str) -> Optional[RepositoryLink]:
+        return self._by_fork.get(full_name.lower())
+
+    def resolve_fork(self, upstream: str) -> Optional[str]:
+        """The full name of the fork of an upstream, `None` if it hasn't been forked."""
+        link = self.by_upstream(upstream)
+        return link.fork if link else None
+
+    def is_deleted(self, fork: str) -> bool:
+        """Whether the upstream of the fork, given by its full name, is known to have been deleted."""
+        link = self.by_fork(fork)
+        return link is not None and link.upstream is None
+
+    def current_names(self, upstreams: Iterable[str]) -> Iterator[str]:
+        """The current names of the upstreams, leaving out the ones known to be deleted."""
+        for name in upstreams:
+            link = self.by_upstream(name)
+            if link is None:
+                yield name
+            elif link.upstream is not None:
+                yield link.upstream
+
+    def _fetch(self, organization: Organization) -> Iterator[dict]:
+        after = None
+        while True:
+            _, response = organization._requester.requestJsonAndCheck(
+                "POST",
+                "/graphql",
+                input={"query": _FORKS_QUERY, "variables": {"login": organization.login, "after": after}}
+            )
+            # Errors about single nodes, like a parent that's no longer accessible, come with the rest of the data
+            if response.get('data') is None or response['data'].get('organization') is None:
+                raise ValueError(f"GraphQL query failed: {response.get('errors')}")
+            for error in response.get('errors') or []:
+                print(f"\tIgnoring a GraphQL error: {error.get('message', error)}")
+            repositories = response['data']['organization']['repositories']
+            yield from repositories['nodes']
+            if not repositories['pageInfo']['hasNextPage']:
+                return
+            after = repositories['pageInfo']['endCursor']
+
+    def refresh(self, organization: Organization) -> list[ReconcileChange]:
+        """
+        Reload every fork in the organization along with its upstream, 100 per request,
+        and report what changed since the last refresh.
+        """
+        changes = []
+        links = {}
+        for node in self._fetch(organization):
+            parent = node.get('parent')
+            previous = self._links.get(node['id'])
+            link = RepositoryLink(
+                fork_id=node['id'],
+                fork=node['nameWithOwner'],
+                upstream_id=parent['id'] if parent else None,
+                upstream=parent['nameWithOwner'] if parent else None,
+                previous_upstreams=list(previous.previous_upstreams) if previous else [],
+            )
+            # The fork's own name records what the upstream was called when it was forked
+            original = upstream_repository_name(link.fork)
+            if link.upstream is not None and link.upstream.lower() != original.lower() \
+                    and original not in link.previous_upstreams:
+                link.previous_upstreams.append(original)
+
+            if previous is None:
+                changes.append(ReconcileChange(ADDED, link.fork, after=link.upstream))
+            elif link.upstream is None and previous.upstream is not None:
+                changes.append(ReconcileChange(DELETED, link.fork, before=previous.upstream))
+            elif previous.upstream_id is not None and link.upstream_id != previous.upstream_id:
+                # GitHub hands a fork over to another fork in the network when its upstream is deleted
+                changes.append(ReconcileChange(REPARENTED, link.fork, before=previous.upstream, after=link.upstream))
+            elif link.upstream is not None and previous.upstream is not None \
+                    and link.upstream.lower() != previous.upstream.lower():
+                changes.append(
+                    ReconcileChange(_upstream_change(previous.upstream, link.upstream), link.fork,
+                                    before=previous.upstream, after=link.upstream)
+                )
+            if previous is not None and previous.upstream and previous.upstream != link.upstream \
+                    and previous.upstream not in link.previous_upstreams:
+                link.previous_upstreams.append(previous.upstream)
+            links[link.fork_id] = link
+
+        for fork_id, previous in self._links.items():
+            if fork_id not in links:
+                changes.append(ReconcileChange(REMOVED, previous.fork, before=previous.upstream))
+        self._links = links
+        self._reindex()
+        return changes
+
+    def save(self):
+        with open(self._path, "w") as index_file:
+            json.dump(
+                {fork_id: asdict(link) for fork_id, link in sorted(self._links.items())},
+                index_file,
+                indent=4
+            )
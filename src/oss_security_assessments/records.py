@@ -0,0 +1,126 @@
+"""
+Lightweight stand-ins for PyGithub `Repository` objects.
+
+A `Repository` keeps its whole raw API response, several kilobytes per repository, for as long as it's referenced.
+The records keep only the fields this project reads, and build a full `Repository` from them on demand without
+another API call.
+"""
+from datetime import datetime
+from typing import Iterator, Optional
+
+from github.PaginatedList import PaginatedList
+from github.Repository import Repository
+
+
+def iter_pages(paginated: PaginatedList) -> Iterator:
+    """
+    Iterate a paginated listing one page at a time. Iterating a `PaginatedList` directly keeps every element it has
+    returned in the list, so a listing of the whole organization stays in memory until the list itself is dropped.
+    """
+    page = 0
+    page_size = 0
+    while True:
+        elements = paginated.get_page(page)
+        yield from elements
+        # Every page but the last is full
+        page_size = max(page_size, len(elements))
+        if not elements or len(elements) < page_size:
+            return
+        page += 1
+
+
+class RepositoryRecord:
+    __slots__ = (
+        "_requester",
+        "node_id",
+        "full_name",
+        "name",
+        "owner_login",
+        "url",
+        "clone_url",
+        "default_branch",
+        "fork",
+        "archived",
+        "has_issues",
+        "has_projects",
+        "has_wiki",
+        "pushed_at",
+        "stargazers_count",
+    )
+
+    def __init__(
+            self,
+            requester,
+            node_id: str,
+            full_name: str,
+            url: str,
+            clone_url: str,
+            default_branch: Optional[str],
+            fork: bool,
+            archived: bool,
+            has_issues: bool,
+            has_projects: bool,
+            has_wiki: bool,
+            pushed_at: Optional[datetime],
+            stargazers_count: int,
+    ):
+        # The requester is shared by every object from the same client, holding on to it costs nothing
+        self._requester = requester
+        self.node_id = node_id
+        self.full_name = full_name
+        self.owner_login, _, self.name = full_name.partition("/")
+        self.url = url
+        self.clone_url = clone_url
+        self.default_branch = default_branch
+        self.fork = fork
+        self.archived = archived
+        self.has_issues = has_issues
+        self.has_projects = has_projects
+        self.has_wiki = has_wiki
+        self.pushed_at = pushed_at
+        self.stargazers_count = stargazers_count
+
+    @classmethod
+    def from_repository(cls, repository: Repository) -> "RepositoryRecord":
+        return cls(
+            requester=repository._requester,
+            node_id=repository.node_id,
+            full_name=repository.full_name,
+            url=repository.url,
+            clone_url=repository.clone_url,
+            default_branch=repository.default_branch,
+            fork=repository.fork,
+            archived=repository.archived,
+            has_issues=repository.has_issues,
+            has_projects=repository.has_projects,
+            has_wiki=repository.has_wiki,
+            pushed_at=repository.pushed_at,
+            stargazers_count=repository.stargazers_count,
+        )
+
+    def materialize(self) -> Repository:
+        """A full PyGithub `Repository` built from the record, attributes the record doesn't keep are `None`."""
+        return Repository(
+            self._requester,
+            {},
+            {
+                "node_id": self.node_id,
+                "full_name": self.full_name,
+                "name": self.name,
+                "owner": {"login": self.owner_login},
+                "url": self.url,
+                "clone_url": self.clone_url,
+                "default_branch": self.default_branch,
+                "fork": self.fork,
+                "archived": self.archived,
+                "has_issues": self.has_issues,
+                "has_projects": self.has_projects,
+                "has_wiki": self.has_wiki,
+                "pushed_at": self.pushed_at.strftime("%Y-%m-%dT%H:%M:%SZ") if self.pushed_at else None,
+                "stargazers_count": self.stargazers_count,
+            },
+            True,
+        )
+
+    def __repr__(self):
+        return f"RepositoryRecord(full_name={self.full_name!r})"
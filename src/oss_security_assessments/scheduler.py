@@ -0,0 +1,202 @@
+import heapq
+import itertools
+import json
+import math
+from dataclasses import dataclass, fields
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Generic, Iterator, Optional, TypeVar
+
+from github.Repository import Repository
+
+from oss_security_assessments.languages import codeql_coverage
+from oss_security_assessments.util import fork_repository_name
+
+T = TypeVar("T")
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+@dataclass
+class PriorityWeights:
+    """How much each signal contributes to a repository's priority."""
+    activity: float = 1.0
+    stars: float = 1.0
+    language_coverage: float = 1.0
+    staleness: float = 1.0
+    failures: float = 1.0
+
+    @classmethod
+    def parse(cls, value: str) -> "PriorityWeights":
+        """Parse weights from a string like `stars=2,failures=0.5`."""
+        weights = cls()
+        names = {field.name for field in fields(cls)}
+        for pair in filter(None, (part.strip() for part in value.split(","))):
+            name, _, weight = pair.partition("=")
+            name = name.strip().replace("-", "_")
+            if name not in names:
+                raise ValueError(f"Unknown priority signal `{name}`, expected one of {', '.join(sorted(names))}")
+            setattr(weights, name, float(weight))
+        return weights
+
+
+@dataclass
+class UpstreamActivity:
+    """How active and popular a fork's upstream is, a fork's own push times only say when it was last synced."""
+    pushed_at: Optional[datetime] = None
+    stargazers_count: int = 0
+
+
+@dataclass
+class RepositorySignals:
+    """The inputs used to score a single repository."""
+    pushed_at: Optional[datetime] = None
+    stargazers_count: int = 0
+    languages: Optional[dict[str, int]] = None
+    last_synced: Optional[datetime] = None
+    failures: int = 0
+
+    def score(self, weights: PriorityWeights, now: datetime) -> float:
+        """Higher scores are processed first. Every signal is normalized to the range [0, 1] before weighting."""
+        pushed_at = _as_utc(self.pushed_at)
+        if pushed_at is None:
+            activity = 0.0
+        else:
+            activity = 1 / (1 + max((now - pushed_at).days, 0) / 30)
+        stars = min(math.log10(1 + max(self.stargazers_count, 0)) / 5, 1.0)
+        # Unknown language mix sits in the middle so it neither wins nor loses by default
+        coverage = 0.5 if self.languages is None else codeql_coverage(self.languages)
+        last_synced = _as_utc(self.last_synced)
+        if last_synced is None:
+            staleness = 1.0
+        else:
+            days = max((now - last_synced).total_seconds() / 86400, 0)
+            staleness = days / (days + 7)
+        failure_penalty = 1 - 1 / (1 + self.failures)
+        return (
+                weights.activity * activity
+                + weights.stars * stars
+                + weights.language_coverage * coverage
+                + weights.staleness * staleness
+                - weights.failures * failure_penalty
+        )
+
+
+class ScheduleHistory:
+    """
+    A record of when each repository was last processed successfully and how many times in a row it has failed.
+
+    When created without a path the history only lives for the current run.
+    """
+    _path: Optional[Path]
+    _entries: dict[str, dict]
+
+    def __init__(self, path: Optional[Path] = None):
+        self._path = path
+        self._entries = {}
+        if path is not None and path.exists():
+            with open(path) as history_file:
+                self._entries = json.load(history_file)
+
+    def last_synced(self, name: str) -> Optional[datetime]:
+        value = self._entries.get(name, {}).get("last_synced")
+        return datetime.fromisoformat(value) if value else None
+
+    def failures(self, name: str) -> int:
+        return self._entries.get(name, {}).get("failures", 0)
+
+    def record_success(self, name: str, when: Optional[datetime] = None):
+        entry = self._entries.setdefault(name, {})
+        entry["last_synced"] = (when or datetime.now(timezone.utc)).isoformat()
+        entry["failures"] = 0
+
+    def record_failure(self, name: str):
+        entry = self._entries.setdefault(name, {})
+        entry["failures"] = entry.get("failures", 0) + 1
+
+    def save(self):
+        if self._path is None:
+            return
+        with open(self._path, "w") as history_file:
+            json.dump(self._entries, history_file, indent=4, sort_keys=True)
+
+
+def upstream_key(repository: Repository) -> str:
+    """Key an upstream repository by the name its fork has in the organization."""
+    return fork_repository_name(repository.full_name)
+
+
+def fork_key(repository: Repository) -> str:
+    """Key a fork in the organization by its own name."""
+    return repository.name
+
+
+class RepositoryScheduler(Generic[T]):
+    """
+    A priority queue of repositories, ordered so the most valuable ones are processed first.
+
+    Repositories can be pushed while the scheduler is being iterated, they are picked up in priority order.
+    Forks (`fork_key`) are scored by the activity of their upstream, looked up in `upstreams` by name,
+    any other repository by its own.
+    """
+    _heap: list[tuple[float, int, T]]
+    _counter: Iterator[int]
+
+    def __init__(
+            self,
+            weights: Optional[PriorityWeights] = None,
+            history: Optional[ScheduleHistory] = None,
+            languages: Optional[dict[str, dict[str, int]]] = None,
+            key: Callable[[T], str] = fork_key,
+            upstreams: Optional[dict[str, UpstreamActivity]] = None,
+    ):
+        self.weights = weights or PriorityWeights()
+        self.history = history or ScheduleHistory()
+        self._languages = languages or {}
+        self.key = key
+        self.upstreams = upstreams if upstreams is not None else {}
+        self._heap = []
+        # Ties keep insertion order and keep the heap from ever comparing repositories
+        self._counter = itertools.count()
+
+    def signals(self, repository: T) -> RepositorySignals:
+        name = self.key(repository)
+        if self.key is fork_key:
+            # Syncing pushes to the fork, its own `pushed_at` would put the forks synced last first
+            activity = self.upstreams.get(name, UpstreamActivity())
+        else:
+            activity = UpstreamActivity(
+                getattr(repository, "pushed_at", None),
+                getattr(repository, "stargazers_count", 0) or 0
+            )
+        return RepositorySignals(
+            pushed_at=activity.pushed_at,
+            stargazers_count=activity.stargazers_count,
+            languages=self._languages.get(name),
+            last_synced=self.history.last_synced(name),
+            failures=self.history.failures(name),
+        )
+
+    def score(self, repository: T) -> float:
+        return self.signals(repository).score(self.weights, datetime.now(timezone.utc))
+
+    def push(self, repository: T, score: Optional[float] = None):
+        if score is None:
+            score = self.score(repository)
+        heapq.heappush(self._heap, (-score, next(self._counter), repository))
+
+    def pop(self) -> T:
+        return heapq.heappop(self._heap)[2]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __iter__(self) -> Iterator[T]:
+        while self._heap:
+            yield self.pop()
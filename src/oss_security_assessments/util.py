@@ -1,4 +1,14 @@
+import json
 import os
+from collections import deque
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, TextIO, TypeVar
+
+from github.GithubException import GithubException
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 
 def get_env_var(name: str) -> str:
@@ -9,6 +19,100 @@ def get_env_var(name: str) -> str:
     return value
 
 
+def github_message(e: GithubException) -> str:
+    """GitHub's message for a failed request, the body of the response isn't always a JSON object."""
+    return e.data['message'] if isinstance(e.data, dict) and 'message' in e.data else str(e.data)
+
+
+def error_message(e: Exception) -> str:
+    """GitHub's message for a failed request, or the type and message of any other error, like a connection reset."""
+    if isinstance(e, GithubException):
+        return github_message(e)
+    return f"{type(e).__name__}: {e}"
+
+
+def fork_repository_name(upstream_full_name: str) -> str:
+    """The name a fork of `owner/name` is given in the organization: `owner__name`."""
+    return upstream_full_name.replace('/', '__', 1)
+
+
+def upstream_repository_name(fork_name: str) -> str:
+    """The inverse of `fork_repository_name`, GitHub logins can't contain `__` so the first one splits the name."""
+    return fork_name.split('/', 1)[-1].replace('__', '/', 1)
+
+
+def iter_json_array(file: TextIO, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """Decode the elements of a top level JSON array one at a time, without reading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def skip(characters: str) -> bool:
+        """Skip the characters, reading more when needed. Returns False at the end of the file."""
+        nonlocal buffer, position, eof
+        while True:
+            while position < len(buffer) and buffer[position] in characters:
+                position += 1
+            if position < len(buffer):
+                return True
+            if eof:
+                return False
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer, position = chunk, 0
+
+    if not skip(" \t\r\n") or buffer[position] != "[":
+        raise ValueError("Expected a JSON array")
+    position += 1
+    while True:
+        if not skip(" \t\r\n,"):
+            raise ValueError("Unterminated JSON array")
+        if buffer[position] == "]":
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+            # A number cut off by the end of the buffer still decodes, `0.72` read as `0.` decodes as `0`
+            complete = eof or (end < len(buffer) and buffer[end] in " \t\r\n,]")
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield element
+        position = end
+
+
+def iter_alert_export(path: Path) -> Iterator[dict]:
+    """Stream the alerts written by `scripts/code_scanning_puller2.py`."""
+    with open(path) as export_file:
+        yield from iter_json_array(export_file)
+
+
+def bounded_map(executor: Executor, function: Callable[[T], R], items: Iterable[T], window: int) -> Iterator[R]:
+    """
+    Like `executor.map`, but only `window` items are taken from `items` ahead of the results being consumed,
+    so a lazy iterable is never read into memory all at once.
+    If `items` raises, the results of the items already submitted are yielded before the error is.
+    """
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+    except Exception:
+        while pending:
+            yield pending.popleft().result()
+        raise
+    while pending:
+        yield pending.popleft().result()
+
+
 def fibonacci(n):
     if n < 0:
         raise ValueError("Negative arguments not implemented")
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from oss_security_assessments.alerts import AlertFrame  # noqa: E402
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def alert(number: int, created_at, security_severity=None, severity="warning", repository="org/owner__name") -> dict:
+    return {
+        "number": number,
+        "state": "open",
+        "created_at": created_at,
+        "rule": {"id": "py/sql-injection", "severity": severity, "security_severity_level": security_severity},
+        "repository": {"full_name": repository},
+    }
+
+
+def test_age_buckets_count_missing_dates_as_unknown():
+    frame = AlertFrame([
+        alert(1, "2024-05-30T00:00:00Z"),
+        alert(2, "2023-01-01T00:00:00Z"),
+        alert(3, None),
+    ])
+    buckets = frame.age_buckets(now=NOW)
+    assert buckets["< 1 week"] == 1
+    assert buckets[">= 1 year"] == 1
+    assert buckets["unknown"] == 1
+
+
+def test_age_buckets_respect_the_mask():
+    frame = AlertFrame([alert(1, None), alert(2, "2024-05-30T00:00:00Z")])
+    buckets = frame.age_buckets(now=NOW, mask=frame.number == 2)
+    assert buckets["< 1 week"] == 1
+    assert "unknown" not in buckets
+
+
+def test_security_severity_and_severity_are_separate_columns():
+    frame = AlertFrame([
+        alert(1, None, security_severity="critical", severity="error"),
+        alert(2, None, security_severity=None, severity="note"),
+    ])
+    assert frame.security_severity.counts() == {"critical": 1, "none": 1}
+    assert frame.severity.counts() == {"error": 1, "note": 1}
+    assert frame.top_repositories("critical") == {"org/owner__name": 1}
+
+
+def test_new_alerts():
+    previous = AlertFrame([alert(1, None), alert(2, None, repository="org/other")])
+    current = AlertFrame([alert(1, None), alert(3, None), alert(2, None, repository="org/third")])
+    assert current.new_alerts(previous).tolist() == [False, True, True]
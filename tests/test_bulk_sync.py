@@ -0,0 +1,136 @@
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from github import GithubException
+
+from oss_security_assessments.bulk_sync import (
+    ARCHIVED,
+    CONFLICT,
+    FAILED,
+    FAST_FORWARD,
+    UP_TO_DATE,
+    UPSTREAM_DELETED,
+    SyncOutcome,
+    TriageQueue,
+    classify_exception,
+    default_branch_heads,
+    sync_one,
+    upstream_activity,
+)
+from oss_security_assessments.rate_limit import RateLimiter
+from oss_security_assessments.records import RepositoryRecord
+
+
+@pytest.mark.parametrize("status, message, outcome", [
+    (409, "Merge conflict", CONFLICT),
+    (422, "This branch has diverged from the upstream", CONFLICT),
+    (404, "Not Found", UPSTREAM_DELETED),
+    (422, "Repository is not a fork", UPSTREAM_DELETED),
+    (403, "Repository was archived so is read-only.", ARCHIVED),
+    (500, "Server Error", FAILED),
+])
+def test_classify_exception(status, message, outcome):
+    assert classify_exception(GithubException(status, {"message": message}, None)) == outcome
+
+
+def repository(respond):
+    class Requester:
+        def requestJsonAndCheck(self, verb, url, input=None):
+            return respond()
+
+    return RepositoryRecord(
+        requester=Requester(),
+        node_id="R_1",
+        full_name="org/owner__name",
+        url="https://api.github.com/repos/org/owner__name",
+        clone_url="https://github.com/org/owner__name.git",
+        default_branch="main",
+        fork=True,
+        archived=False,
+        has_issues=False,
+        has_projects=False,
+        has_wiki=False,
+        pushed_at=None,
+        stargazers_count=0,
+    )
+
+
+def test_sync_one_classifies_the_merge():
+    outcome = sync_one(repository(lambda: ({}, {"merge_type": "fast-forward"})), RateLimiter(1000))
+    assert outcome.outcome == FAST_FORWARD
+    outcome = sync_one(repository(lambda: ({}, {"merge_type": "none"})), RateLimiter(1000))
+    assert outcome.outcome == UP_TO_DATE
+
+
+def test_sync_one_configures_through_the_same_limiter():
+    limiter = RateLimiter(1000)
+    configured = []
+
+    def configure(record, configure_limiter):
+        configure_limiter.call(lambda: configured.append(record.name))
+
+    outcome = sync_one(repository(lambda: ({}, {"merge_type": "fast-forward"})), limiter, configure)
+    assert outcome.outcome == FAST_FORWARD
+    assert configured == ["owner__name"]
+    # The merge and the configuration
+    assert limiter.request_count == 2
+
+
+def test_sync_one_never_raises():
+    def connection_reset():
+        raise ConnectionResetError("Connection reset by peer")
+
+    outcome = sync_one(repository(connection_reset), RateLimiter(1000))
+    assert outcome.outcome == FAILED
+    assert "Connection reset by peer" in outcome.message
+
+    def configure(_, limiter):
+        raise ValueError("No workflows")
+
+    outcome = sync_one(repository(lambda: ({}, {"merge_type": "merge"})), RateLimiter(1000), configure)
+    assert outcome.outcome == FAILED
+    assert "No workflows" in outcome.message
+
+
+def test_triage_queue_round_trip(tmp_path: Path):
+    path = tmp_path / "triage.json"
+    triage = TriageQueue(path)
+    triage.record(SyncOutcome("first", CONFLICT, "Merge conflict"))
+    triage.record(SyncOutcome("first", CONFLICT, "Merge conflict"))
+    triage.record(SyncOutcome("second", FAILED))
+    triage.record(SyncOutcome("second", FAST_FORWARD))
+    triage.save()
+
+    reloaded = TriageQueue(path)
+    assert list(reloaded.entries()) == ["first"]
+    assert reloaded.entries()["first"]["attempts"] == 2
+
+
+def test_default_branch_heads():
+    queries = []
+
+    class Requester:
+        def requestJsonAndCheck(self, verb, url, input=None):
+            queries.append(input["query"])
+            data = {"r0": {"defaultBranchRef": {"target": {"oid": "abc"}}}, "r1": None}
+            return {}, {"data": data}
+
+    heads = default_branch_heads(Requester(), ["org/first", "org/deleted", "org/third"], RateLimiter(1000), 2)
+    assert len(queries) == 2
+    assert heads == {"org/first": "abc", "org/third": "abc"}
+
+
+def test_upstream_activity():
+    class Requester:
+        def requestJsonAndCheck(self, verb, url, input=None):
+            data = {
+                "r0": {"parent": {"pushedAt": "2024-06-01T12:00:00Z", "stargazerCount": 42}},
+                "r1": {"parent": None},
+            }
+            return {}, {"data": data}
+
+    activity = upstream_activity(Requester(), ["org/owner__name", "org/not-a-fork"], RateLimiter(1000))
+    assert list(activity) == ["org/owner__name"]
+    assert activity["org/owner__name"].pushed_at == datetime(2024, 6, 1, 12, tzinfo=timezone.utc)
+    assert activity["org/owner__name"].stargazers_count == 42
@@ -0,0 +1,94 @@
+import io
+import json
+from pathlib import Path
+
+from oss_security_assessments.catalog import (
+    CatalogBuilder,
+    CatalogEntry,
+    RepositoryCatalog,
+    export_repository_languages,
+    export_repository_names,
+    import_repository_languages,
+    import_repository_names,
+)
+
+SHA = "0123456789abcdef0123456789abcdef01234567"
+
+
+def build(path: Path) -> Path:
+    builder = CatalogBuilder()
+    builder.add(CatalogEntry(
+        upstream="apache/commons-text",
+        fork="Org/apache__commons-text",
+        languages={"Java": 1000, "Shell": 10},
+        default_setup="configured",
+        last_synced_sha=SHA,
+    ))
+    builder.entry("wolfi-dev/os")
+    builder.write(path)
+    return path
+
+
+def test_round_trip(tmp_path: Path):
+    with RepositoryCatalog(build(tmp_path / "catalog.bin")) as catalog:
+        assert len(catalog) == 2
+        assert "wolfi-dev/os" in catalog
+        assert "wolfi-dev/missing" not in catalog
+
+        record = catalog.get("apache/commons-text")
+        assert record is not None
+        assert record.fork == "Org/apache__commons-text"
+        assert record.languages == {"Java": 1000, "Shell": 10}
+        assert record.default_setup == "configured"
+        assert record.last_synced_sha == SHA
+
+        unforked = catalog.get("wolfi-dev/os")
+        assert unforked is not None
+        assert unforked.fork is None
+        assert unforked.languages == {}
+        assert unforked.default_setup == "unknown"
+        assert unforked.last_synced_sha is None
+
+        fork = catalog.get_by_fork("Org/apache__commons-text")
+        assert fork is not None
+        assert fork.upstream == "apache/commons-text"
+        assert catalog.get_by_fork("Org/wolfi-dev__os") is None
+        assert sorted(record.upstream for record in catalog) == ["apache/commons-text", "wolfi-dev/os"]
+
+
+def test_update_from_catalog(tmp_path: Path):
+    path = build(tmp_path / "catalog.bin")
+    with RepositoryCatalog(path) as catalog:
+        builder = CatalogBuilder.from_catalog(catalog)
+        builder.entry("wolfi-dev/os").last_synced_sha = SHA
+    builder.write(path)
+    with RepositoryCatalog(path) as catalog:
+        unforked, forked = catalog.get("wolfi-dev/os"), catalog.get("apache/commons-text")
+        assert unforked is not None and forked is not None
+        assert unforked.last_synced_sha == SHA
+        assert forked.languages == {"Java": 1000, "Shell": 10}
+
+
+def test_import_and_export(tmp_path: Path):
+    builder = CatalogBuilder()
+    import_repository_names(builder, ["apache/commons-text\n", "\n", "wolfi-dev/os\n"])
+    import_repository_languages(builder, io.StringIO(json.dumps([{
+        "repository_name": "Org/apache__commons-text",
+        "languages": {"Java": 1000},
+        "default_code_scanning": {"state": "not-configured"},
+    }])))
+    path = tmp_path / "catalog.bin"
+    builder.write(path)
+
+    with RepositoryCatalog(path) as catalog:
+        names = io.StringIO()
+        export_repository_names(catalog, names)
+        assert sorted(names.getvalue().splitlines()) == ["apache/commons-text", "wolfi-dev/os"]
+
+        languages = io.StringIO()
+        export_repository_languages(catalog, languages)
+        assert json.loads(languages.getvalue()) == [{
+            "repository_name": "Org/apache__commons-text",
+            "languages": {"Java": 1000},
+            "default_code_scanning": {"state": "not-configured"},
+        }]
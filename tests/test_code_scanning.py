@@ -0,0 +1,155 @@
+from types import SimpleNamespace
+
+import pytest
+from github import GithubException
+
+from oss_security_assessments.code_scanning import (
+    DefaultSetupCandidate,
+    DefaultSetupResult,
+    _is_eligible,
+    candidates_from_organization,
+    enable_default_setup,
+    enable_default_setup_in_bulk,
+    poll_default_setup,
+)
+from oss_security_assessments.rate_limit import RateLimiter
+
+RUN_URL = "https://api.github.com/repos/org/owner__name/actions/runs/1"
+
+
+class Requester:
+    """Answers requests from `responses`, keyed by verb and url. A response that is an exception is raised."""
+
+    def __init__(self, responses: dict[tuple[str, str], object]):
+        self.responses = responses
+        self.requests = []
+
+    def requestJsonAndCheck(self, verb, url, input=None):
+        self.requests.append((verb, url, input))
+        response = self.responses[(verb, url)]
+        if isinstance(response, Exception):
+            raise response
+        return {}, response
+
+
+def candidate(requester: Requester, name: str = "org/owner__name") -> DefaultSetupCandidate:
+    repository = SimpleNamespace(_requester=requester, url=f"https://api.github.com/repos/{name}")
+    return DefaultSetupCandidate(name=name, repository=repository, languages=["python"])
+
+
+def setup_url(name: str = "org/owner__name") -> str:
+    return f"https://api.github.com/repos/{name}/code-scanning/default-setup"
+
+
+@pytest.mark.parametrize("languages, default_setup, eligible", [
+    ({"Python": 100}, "not-configured", True),
+    ({"Python": 100}, "configured", False),
+    ({"Shell": 100}, "not-configured", False),
+    ({"Python": 10, "Shell": 90}, "not-configured", False),
+    ({}, "not-configured", False),
+])
+def test_is_eligible(languages, default_setup, eligible):
+    assert _is_eligible(languages, default_setup, minimum_coverage=0.5) == eligible
+
+
+def test_enable_is_pending_until_polled():
+    requester = Requester({("PATCH", setup_url()): {"run_id": 1, "run_url": RUN_URL}})
+    result = enable_default_setup(candidate(requester), RateLimiter(1000))
+    assert result.state == "pending"
+    assert result.run_url == RUN_URL
+    assert len(requester.requests) == 1
+    assert requester.requests[0][2]["languages"] == ["python"]
+
+
+def test_enable_failure_keeps_the_message():
+    requester = Requester({("PATCH", setup_url()): GithubException(403, "Advanced Security must be enabled", None)})
+    result = enable_default_setup(candidate(requester), RateLimiter(1000))
+    assert result.state == "failed"
+    assert result.message == "Advanced Security must be enabled"
+
+
+@pytest.mark.parametrize("run, state, expected", [
+    ({"status": "in_progress"}, "not-configured", "pending"),
+    ({"status": "completed", "conclusion": "success"}, "configured", "configured"),
+    ({"status": "completed", "conclusion": "failure"}, "not-configured", "failed"),
+])
+def test_poll_follows_the_run(run, state, expected):
+    requester = Requester({("GET", RUN_URL): run, ("GET", setup_url()): {"state": state}})
+    result = DefaultSetupResult(name="org/owner__name", state="pending", run_url=RUN_URL)
+    assert poll_default_setup(candidate(requester), result, RateLimiter(1000)).state == expected
+
+
+def test_poll_without_a_run_goes_by_the_state():
+    requester = Requester({("GET", setup_url()): {"state": "not-configured"}})
+    result = DefaultSetupResult(name="org/owner__name", state="pending")
+    assert poll_default_setup(candidate(requester), result, RateLimiter(1000)).state == "not-configured"
+
+
+def test_poll_connection_error_fails_the_setup():
+    requester = Requester({("GET", RUN_URL): ConnectionResetError("Connection reset by peer")})
+    result = DefaultSetupResult(name="org/owner__name", state="pending", run_url=RUN_URL)
+    result = poll_default_setup(candidate(requester), result, RateLimiter(1000))
+    assert result.state == "failed"
+    assert "Connection reset by peer" in result.message
+
+
+def test_bulk_polls_until_configured():
+    requester = Requester({
+        ("PATCH", setup_url()): {"run_url": RUN_URL},
+        ("GET", RUN_URL): {"status": "completed", "conclusion": "success"},
+        ("GET", setup_url()): {"state": "configured"},
+    })
+    [result] = enable_default_setup_in_bulk([candidate(requester)], RateLimiter(1000), poll_interval=0)
+    assert result.state == "configured"
+
+
+def test_bulk_gives_up_after_the_timeout():
+    requester = Requester({
+        ("PATCH", setup_url()): {"run_url": RUN_URL},
+        ("GET", RUN_URL): {"status": "in_progress"},
+    })
+    [result] = enable_default_setup_in_bulk([candidate(requester)], RateLimiter(1000), poll_timeout=0)
+    assert result.state == "pending"
+    # Nothing was polled once the deadline had passed
+    assert [verb for verb, _, _ in requester.requests] == ["PATCH"]
+
+
+def listed_repository(name: str, languages):
+    def get_languages():
+        if isinstance(languages, Exception):
+            raise languages
+        return languages
+
+    full_name = f"org/{name}"
+    return SimpleNamespace(
+        _requester=Requester({("GET", setup_url(full_name)): {"state": "not-configured"}}),
+        node_id=name,
+        full_name=full_name,
+        name=name,
+        url=f"https://api.github.com/repos/{full_name}",
+        clone_url=f"https://github.com/{full_name}.git",
+        default_branch="main",
+        fork=True,
+        archived=False,
+        has_issues=False,
+        has_projects=False,
+        has_wiki=False,
+        pushed_at=None,
+        stargazers_count=0,
+        get_languages=get_languages,
+    )
+
+
+def test_listing_skips_repositories_that_cannot_be_inspected():
+    repositories = [
+        listed_repository("owner__python", {"Python": 100}),
+        listed_repository("owner__reset", ConnectionResetError("Connection reset by peer")),
+        listed_repository("owner__blocked", GithubException(403, "Repository access blocked", None)),
+        listed_repository("owner__shell", {"Shell": 100}),
+    ]
+    organization = SimpleNamespace(get_repos=lambda: SimpleNamespace(
+        get_page=lambda page: repositories if page == 0 else []
+    ))
+    candidates = candidates_from_organization(organization, RateLimiter(1000), minimum_coverage=0.5, concurrency=2)
+    assert [found.name for found in candidates] == ["org/owner__python"]
+    assert candidates[0].languages == ["python"]
@@ -0,0 +1,133 @@
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+from github import GithubException
+
+from oss_security_assessments.daemon import DaemonMetrics, SyncDaemon, UpstreamWatcher
+from oss_security_assessments.rate_limit import RateLimiter
+
+
+class Requester:
+    """Answers the watcher's GraphQL queries from `heads`, keyed by full name, raising `fail[name]` when set."""
+
+    def __init__(self, heads: dict[str, str]):
+        self.heads = heads
+        self.fail: dict[str, Exception] = {}
+
+    def requestJsonAndCheck(self, verb, url, input=None):
+        data = {"rateLimit": {"cost": 1}}
+        for alias, owner, name in re.findall(r'(\w+): repository\(owner: "([^"]+)", name: "([^"]+)"\)', input["query"]):
+            full_name = f"{owner}/{name}"
+            if full_name in self.fail:
+                raise self.fail[full_name]
+            head = self.heads.get(full_name)
+            data[alias] = {"defaultBranchRef": {"target": {"oid": head}}} if head else None
+        return {}, {"data": data}
+
+
+def watcher(requester: Requester, names: list[str], batch_size: int = 50) -> UpstreamWatcher:
+    organization = SimpleNamespace(login="org", _requester=requester)
+    watcher = UpstreamWatcher(organization, batch_size=batch_size)
+    watcher.inventory = {name: SimpleNamespace(name=name) for name in names}
+    return watcher
+
+
+def test_first_poll_reports_forks_behind_their_upstream():
+    requester = Requester({"owner/a": "1", "org/owner__a": "1", "owner/b": "2", "org/owner__b": "1"})
+    metrics = DaemonMetrics()
+    assert watcher(requester, ["owner__a", "owner__b"]).poll(metrics, RateLimiter(1000)) == ["owner__b"]
+    assert metrics.graphql_cost == 1
+
+
+def test_poll_reports_moved_upstreams():
+    requester = Requester({"owner/a": "1", "org/owner__a": "1", "owner/gone": None})
+    watching = watcher(requester, ["owner__a", "owner__gone"])
+    metrics = DaemonMetrics()
+    assert watching.poll(metrics, RateLimiter(1000)) == []
+    assert metrics.upstreams_missing == 1
+
+    requester.heads["owner/a"] = "2"
+    assert watching.poll(metrics, RateLimiter(1000)) == ["owner__a"]
+    assert watching.poll(metrics, RateLimiter(1000)) == []
+
+
+def test_failed_batch_loses_no_changes():
+    requester = Requester({"owner/a": "1", "org/owner__a": "1", "owner/b": "1", "org/owner__b": "1"})
+    watching = watcher(requester, ["owner__a", "owner__b"], batch_size=1)
+    assert watching.poll(DaemonMetrics(), RateLimiter(1000)) == []
+
+    requester.heads["owner/a"] = "2"
+    requester.fail["owner/b"] = ConnectionError("Connection reset by peer")
+    with pytest.raises(ConnectionError):
+        watching.poll(DaemonMetrics(), RateLimiter(1000))
+
+    del requester.fail["owner/b"]
+    assert watching.poll(DaemonMetrics(), RateLimiter(1000)) == ["owner__a"]
+
+
+@pytest.fixture
+def daemon():
+    github = SimpleNamespace(get_organization=lambda name: SimpleNamespace(login=name, _requester=Requester({})))
+    daemon = SyncDaemon(github, "org", sync=lambda repository: None, poll_interval=60)
+    server = daemon.serve_http("127.0.0.1", 0)
+    yield daemon, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def get(url: str) -> tuple[int, str]:
+    try:
+        with urlopen(url) as response:
+            return response.status, response.read().decode()
+    except HTTPError as e:
+        return e.code, e.read().decode()
+
+
+def test_healthz(daemon):
+    daemon, url = daemon
+    daemon.metrics.last_poll = datetime.now(timezone.utc)
+    status, body = get(f"{url}/healthz")
+    assert status == 200
+    assert json.loads(body)["status"] == "ok"
+
+    daemon.metrics.last_poll -= timedelta(hours=1)
+    status, body = get(f"{url}/healthz")
+    assert status == 503
+    assert json.loads(body)["status"] == "stale"
+
+
+def test_healthz_reports_dead_workers(daemon):
+    daemon, url = daemon
+    daemon._threads = [SimpleNamespace(is_alive=lambda: False)]
+    status, body = get(f"{url}/healthz")
+    assert status == 503
+    assert json.loads(body)["workers_alive"] == 0
+
+
+def test_metrics(daemon):
+    daemon, url = daemon
+    daemon.metrics.sync_outcomes["fast-forward"] = 2
+    status, body = get(f"{url}/metrics")
+    assert status == 200
+    assert 'oss_security_assessments_sync_outcomes_total{outcome="fast-forward"} 2' in body
+
+
+def test_run_survives_failed_polls():
+    github = SimpleNamespace(get_organization=lambda name: SimpleNamespace(login=name, _requester=Requester({})))
+    daemon = SyncDaemon(github, "org", sync=lambda repository: None, poll_interval=0.01)
+    failures = iter([GithubException(502, None, None), ConnectionError("Connection refused")])
+
+    def refresh_inventory():
+        failure = next(failures, None)
+        if failure is None:
+            daemon.stop()
+        else:
+            raise failure
+
+    daemon.watcher.refresh_inventory = refresh_inventory
+    daemon.run(port=0)
+    assert daemon.metrics.poll_errors == 2
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+from oss_security_assessments.fingerprints import FingerprintIndex, dismiss_cluster, normalize_path
+from oss_security_assessments.rate_limit import RateLimiter
+
+
+def alert(repository: str, path: str, number: int = 1, start_line: int = 10) -> dict:
+    return {
+        "number": number,
+        "state": "open",
+        "rule": {"id": "py/sql-injection"},
+        "repository": {"full_name": repository},
+        "most_recent_instance": {
+            "message": {"text": "This query depends on a user-provided value."},
+            "location": {"path": path, "start_line": start_line, "start_column": 5, "end_line": start_line,
+                         "end_column": 20},
+        },
+    }
+
+
+def test_normalize_path():
+    assert normalize_path("src/vendor/github.com/lib/query.go") == "github.com/lib/query.go"
+    assert normalize_path("a/node_modules/left-pad/node_modules/lib/index.js") == "lib/index.js"
+    assert normalize_path("src/main.c") == "src/main.c"
+
+
+def test_vendored_copies_are_grouped_across_repositories():
+    index = FingerprintIndex([
+        alert("org/first", "vendor/lib/query.py"),
+        alert("org/second", "third_party/lib/query.py"),
+    ])
+    [cluster] = index.clusters.values()
+    assert cluster.vendored
+    assert cluster.repositories == {"org/first", "org/second"}
+
+
+def test_unvendored_paths_are_not_grouped_across_repositories():
+    index = FingerprintIndex([
+        alert("org/first", "setup.py"),
+        alert("org/second", "setup.py"),
+    ])
+    assert len(index) == 2
+    assert not any(cluster.vendored for cluster in index.clusters.values())
+
+
+def test_findings_at_different_locations_are_not_grouped():
+    index = FingerprintIndex([
+        alert("org/first", "vendor/lib/query.py", start_line=10),
+        alert("org/second", "vendor/lib/query.py", start_line=42),
+    ])
+    assert len(index) == 2
+
+
+def test_find_by_prefix():
+    index = FingerprintIndex([alert("org/first", "setup.py")])
+    [fingerprint] = index.clusters
+    assert index.find(fingerprint[:6]).fingerprint == fingerprint
+
+
+def test_dismiss_cluster_survives_failed_requests():
+    class Requester:
+        def requestJsonAndCheck(self, verb, url, input=None):
+            if "org/first" in url:
+                raise ConnectionResetError("Connection reset by peer")
+            return {}, {}
+
+    github = SimpleNamespace(get_repo=lambda name, lazy: SimpleNamespace(
+        _requester=Requester(), url=f"https://api.github.com/repos/{name}"
+    ))
+    index = FingerprintIndex([
+        alert("org/first", "vendor/lib/query.py", number=1),
+        alert("org/second", "vendor/lib/query.py", number=2),
+    ])
+    [cluster] = index.clusters.values()
+    outcome = dismiss_cluster(github, cluster, "false positive", None, RateLimiter(1000))
+    assert [reference.repository for reference in outcome["dismissed"]] == ["org/second"]
+    assert [reference.repository for reference in outcome["failed"]] == ["org/first"]
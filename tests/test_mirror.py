@@ -0,0 +1,121 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from oss_security_assessments.mirror import MirrorError, MirrorStore, RepositoryNotFoundError, parse_size
+
+
+def git(*args: str, cwd: Path):
+    subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def remote(tmp_path: Path):
+    """An empty bare repository, and a function that commits files to it."""
+    bare = tmp_path / "remote.git"
+    bare.mkdir()
+    git("init", "--quiet", "--bare", "--initial-branch=main", cwd=bare)
+    work = tmp_path / "work"
+    work.mkdir()
+    git("init", "--quiet", "--initial-branch=main", cwd=work)
+    git("remote", "add", "origin", str(bare), cwd=work)
+
+    def commit(files: dict[str, str]):
+        for name, content in files.items():
+            path = work / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+        git("add", "--all", cwd=work)
+        git("commit", "--quiet", "--message", "Update", cwd=work)
+        git("push", "--quiet", "origin", "main", cwd=work)
+
+    return bare.as_uri(), commit
+
+
+def test_parse_size():
+    assert parse_size("512") == 512
+    assert parse_size("5G") == 5 << 30
+    assert parse_size("1.5kb") == 1536
+
+
+def test_clone_lists_the_default_branch(tmp_path: Path, remote):
+    url, commit = remote
+    commit({"README.md": "readme", ".github/workflows/ci.yml": "on: push"})
+    store = MirrorStore(tmp_path / "mirrors")
+
+    assert sorted(store.list_tree("owner/name", url)) == [".github", "README.md"]
+    assert store.list_tree("owner/name", url, ".github/workflows") == ["ci.yml"]
+    assert store.list_tree("owner/name", url, "missing") is None
+    assert store.path("owner/name").is_dir()
+
+
+def test_fetch_picks_up_new_commits(tmp_path: Path, remote):
+    url, commit = remote
+    commit({"README.md": "readme"})
+    store = MirrorStore(tmp_path / "mirrors")
+    assert store.list_tree("owner/name", url) == ["README.md"]
+
+    commit({"setup.py": "setup()"})
+    # Still fresh enough, the mirror isn't fetched again
+    assert store.list_tree("owner/name", url) == ["README.md"]
+    assert sorted(store.list_tree("owner/name", url, max_age=0)) == ["README.md", "setup.py"]
+
+
+def test_empty_then_populated(tmp_path: Path, remote):
+    url, commit = remote
+    store = MirrorStore(tmp_path / "mirrors")
+    assert store.list_tree("owner/name", url) == []
+    assert store.list_tree("owner/name", url, ".github") is None
+
+    commit({".github/workflows/ci.yml": "on: push"})
+    assert store.list_tree("owner/name", url, ".github/workflows", max_age=0) == ["ci.yml"]
+
+
+def test_evicts_the_least_recently_used_mirror(tmp_path: Path, remote):
+    url, commit = remote
+    commit({"README.md": "readme"})
+    store = MirrorStore(tmp_path / "mirrors")
+    store.mirror("owner/first", url)
+    store.mirror("owner/second", url)
+    store.mirror("owner/first", url)
+    assert store.path("owner/second").exists()
+
+    # Room for a single mirror, the one used last is kept
+    store.max_bytes = store._sizes[store.path("owner/first")]
+    store.mirror("owner/third", url)
+    assert store.path("owner/third").exists()
+    assert not store.path("owner/second").exists()
+    assert not store.path("owner/first").exists()
+
+
+def test_reopened_store_measures_existing_mirrors(tmp_path: Path, remote):
+    url, commit = remote
+    commit({"README.md": "readme"})
+    store = MirrorStore(tmp_path / "mirrors")
+    store.mirror("owner/name", url)
+
+    reopened = MirrorStore(tmp_path / "mirrors")
+    assert reopened._total == store._total > 0
+
+
+def test_missing_repository_is_told_apart(tmp_path: Path):
+    store = MirrorStore(tmp_path / "mirrors")
+    with pytest.raises(RepositoryNotFoundError):
+        store.mirror("owner/name", (tmp_path / "missing.git").as_uri())
+    with pytest.raises(RepositoryNotFoundError):
+        store.mirror("owner/name", str(tmp_path / "missing.git"))
+
+
+def test_missing_git(tmp_path: Path, remote, monkeypatch):
+    url, commit = remote
+    store = MirrorStore(tmp_path / "mirrors")
+    monkeypatch.setenv("PATH", str(tmp_path))
+    with pytest.raises(MirrorError) as raised:
+        store.mirror("owner/name", url)
+    assert not isinstance(raised.value, RepositoryNotFoundError)
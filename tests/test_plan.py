@@ -0,0 +1,63 @@
+from collections import Counter
+
+import pytest
+
+from oss_security_assessments.plan import (
+    CORE,
+    GRAPHQL,
+    CostModel,
+    Plan,
+    PlannedAction,
+    RateLimitSnapshot,
+    plan_fork,
+    plan_sync,
+)
+
+
+def action(name: str, requests: int) -> PlannedAction:
+    return PlannedAction(kind="sync", repository=name, requests=Counter({CORE: requests}))
+
+
+def test_shards_stay_within_budget_including_overhead():
+    plan = Plan(actions=[action(str(index), 3) for index in range(10)], overhead=Counter({CORE: 2}))
+    shards = plan.shards(budget=11)
+    assert [len(shard) for shard in shards] == [3, 3, 3, 1]
+    assert all(sum(a.requests[CORE] for a in shard) + 2 <= 11 for shard in shards)
+    assert [a.repository for shard in shards for a in shard] == [str(index) for index in range(10)]
+
+
+def test_shards_refuse_an_action_over_budget():
+    plan = Plan(actions=[action("huge", 20)])
+    with pytest.raises(ValueError):
+        plan.shards(budget=10)
+
+
+def test_sync_overhead_counts_the_whole_listing():
+    costs = CostModel(workflows_per_repository=2)
+    plan = plan_sync(["first", "second"], costs, listing_size=450)
+    assert plan.overhead[CORE] == 5
+    # One merge-upstream, then disabling the features, listing the workflows and disabling each
+    assert plan.requests()[CORE] == 5 + 2 * (1 + 2 + 2)
+    assert plan_sync([], costs).overhead[CORE] == 1
+
+
+def test_sync_counts_the_graphql_queries():
+    forks = [str(index) for index in range(120)]
+    # The upstreams' activity, then the synced SHAs
+    assert plan_sync(forks, CostModel()).requests()[GRAPHQL] == 3
+    assert plan_sync(forks, CostModel(), records_shas=True).requests()[GRAPHQL] == 6
+
+
+def test_fork_without_catalog_assumes_every_repository_is_forked():
+    plan = plan_fork(["apache/commons-text"], None, CostModel(workflows_per_repository=1))
+    [planned] = plan.actions
+    assert planned.kind == "fork"
+    assert planned.repository == "apache__commons-text"
+
+
+def test_runtime_waits_for_the_rate_limit_to_reset():
+    plan = Plan(actions=[action("first", 100)])
+    costs = CostModel(seconds_per_request=0.1)
+    assert plan.runtime(costs) == pytest.approx(10)
+    rate_limit = RateLimitSnapshot(remaining=50, limit=5000, reset_in=600)
+    assert plan.runtime(costs, rate_limit) == pytest.approx(600)
@@ -0,0 +1,156 @@
+from types import SimpleNamespace
+from typing import Optional
+
+import pytest
+
+from oss_security_assessments.reconcile import (
+    ADDED,
+    DELETED,
+    REMOVED,
+    RENAMED,
+    REPARENTED,
+    TRANSFERRED,
+    ReconciliationIndex,
+)
+
+
+class Requester:
+    """Answers the forks query from `pages`, one list of nodes per page, along with any `errors`."""
+
+    def __init__(self, *pages: list[dict], errors=None, data=True):
+        self.pages = pages
+        self.errors = errors
+        self.data = data
+        self.cursors = []
+
+    def requestJsonAndCheck(self, verb, url, input=None):
+        after = input["variables"]["after"]
+        self.cursors.append(after)
+        if not self.data:
+            return {}, {"data": None, "errors": self.errors}
+        page = int(after or 0)
+        repositories = {
+            "pageInfo": {"hasNextPage": page + 1 < len(self.pages), "endCursor": str(page + 1)},
+            "nodes": self.pages[page],
+        }
+        return {}, {"data": {"organization": {"repositories": repositories}}, "errors": self.errors}
+
+
+def fork(fork_id: str, name: str, parent: Optional[str] = None, parent_id: Optional[str] = None) -> dict:
+    return {
+        "id": fork_id,
+        "nameWithOwner": f"org/{name}",
+        "parent": {"id": parent_id or f"U_{fork_id}", "nameWithOwner": parent} if parent else None,
+    }
+
+
+def organization(requester: Requester):
+    return SimpleNamespace(login="org", _requester=requester)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ReconciliationIndex(tmp_path / "index.json")
+    changes = index.refresh(organization(Requester(
+        [fork("F1", "owner__one", "owner/one")],
+        [fork("F2", "owner__two", "owner/two"), fork("F3", "owner__three", "owner/three")],
+    )))
+    assert [change.kind for change in changes] == [ADDED, ADDED, ADDED]
+    return index
+
+
+def refresh(index: ReconciliationIndex, *nodes: dict, **kwargs):
+    return {change.fork: change for change in index.refresh(organization(Requester(list(nodes), **kwargs)))}
+
+
+def test_pages_through_the_organization(tmp_path):
+    requester = Requester([fork("F1", "owner__one", "owner/one")], [fork("F2", "owner__two", "owner/two")])
+    index = ReconciliationIndex(tmp_path / "index.json")
+    index.refresh(organization(requester))
+    assert requester.cursors == [None, "1"]
+    assert len(index) == 2
+
+
+def test_each_kind_of_change(index):
+    changes = refresh(
+        index,
+        fork("F1", "owner__one", "owner/renamed-one"),
+        fork("F2", "owner__two", "new-owner/two"),
+        fork("F3", "owner__three", None),
+        fork("F4", "owner__four", "owner/four"),
+    )
+    assert changes["org/owner__one"].kind == RENAMED
+    assert (changes["org/owner__one"].before, changes["org/owner__one"].after) == ("owner/one", "owner/renamed-one")
+    assert changes["org/owner__two"].kind == TRANSFERRED
+    assert changes["org/owner__three"].kind == DELETED
+    assert changes["org/owner__four"].kind == ADDED
+    assert index.is_deleted("org/owner__three")
+    assert not index.is_deleted("org/owner__one")
+
+    changes = refresh(index, fork("F1", "owner__one", "someone/one", parent_id="U_other"))
+    assert changes["org/owner__one"].kind == REPARENTED
+    assert {change.kind for change in changes.values() if change.fork != "org/owner__one"} == {REMOVED}
+    assert index.by_fork("org/owner__two") is None
+
+
+def test_unchanged_forks_report_nothing(index):
+    changes = refresh(
+        index,
+        fork("F1", "owner__one", "owner/one"),
+        fork("F2", "owner__two", "owner/two"),
+        fork("F3", "owner__three", "owner/three"),
+    )
+    assert changes == {}
+
+
+def test_rename_chain_resolves_every_earlier_name(index, tmp_path):
+    refresh(index, fork("F1", "owner__one", "owner/one-v2"))
+    refresh(index, fork("F1", "owner__one", "new-owner/one-v3"))
+    link = index.by_fork("org/owner__one")
+    assert link.previous_upstreams == ["owner/one", "owner/one-v2"]
+    for name in ("owner/one", "Owner/One-v2", "new-owner/one-v3"):
+        assert index.resolve_fork(name) == "org/owner__one"
+    assert list(index.current_names(["owner/one", "owner/one-v2", "unknown/repository"])) == [
+        "new-owner/one-v3", "new-owner/one-v3", "unknown/repository"
+    ]
+
+    index.save()
+    reloaded = ReconciliationIndex(tmp_path / "index.json")
+    assert reloaded.resolve_fork("owner/one-v2") == "org/owner__one"
+
+
+def test_current_names_leave_out_deleted_upstreams(index):
+    refresh(index, fork("F1", "owner__one", None), fork("F2", "owner__two", "owner/two"))
+    assert list(index.current_names(["owner/one", "owner/two"])) == ["owner/two"]
+
+
+def test_a_reused_name_resolves_to_its_current_owner(index):
+    # owner/one was renamed, then another repository took its old name and was forked as well
+    refresh(
+        index,
+        fork("F1", "owner__one", "owner/one-renamed"),
+        fork("F5", "owner__one-new", "owner/one"),
+    )
+    assert index.resolve_fork("owner/one") == "org/owner__one-new"
+    assert index.resolve_fork("owner/one-renamed") == "org/owner__one"
+
+
+def test_partial_errors_keep_the_data(index, capsys):
+    errors = [{"message": "Resource not accessible by integration", "path": ["organization", "repositories"]}]
+    changes = refresh(
+        index,
+        fork("F1", "owner__one", None),
+        fork("F2", "owner__two", "owner/two"),
+        fork("F3", "owner__three", "owner/three"),
+        errors=errors,
+    )
+    assert changes["org/owner__one"].kind == DELETED
+    assert len(index) == 3
+    assert "Resource not accessible by integration" in capsys.readouterr().out
+
+
+def test_failed_query_keeps_the_index(index):
+    with pytest.raises(ValueError):
+        refresh(index, data=False, errors=[{"message": "Something went wrong"}])
+    assert len(index) == 3
+    assert index.resolve_fork("owner/one") == "org/owner__one"
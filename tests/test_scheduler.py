@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from oss_security_assessments.scheduler import (
+    PriorityWeights,
+    RepositoryScheduler,
+    RepositorySignals,
+    ScheduleHistory,
+    UpstreamActivity,
+    fork_key,
+    upstream_key,
+)
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def test_parse_weights():
+    weights = PriorityWeights.parse("stars=2, language-coverage=0.5,")
+    assert weights.stars == 2
+    assert weights.language_coverage == 0.5
+    assert weights.activity == 1
+    with pytest.raises(ValueError):
+        PriorityWeights.parse("popularity=2")
+
+
+def test_score_ordering():
+    weights = PriorityWeights()
+    active = RepositorySignals(pushed_at=NOW - timedelta(days=1), last_synced=NOW - timedelta(days=1))
+    dormant = RepositorySignals(pushed_at=NOW - timedelta(days=400), last_synced=NOW - timedelta(days=1))
+    assert active.score(weights, NOW) > dormant.score(weights, NOW)
+
+    popular = RepositorySignals(stargazers_count=10000, last_synced=NOW)
+    obscure = RepositorySignals(stargazers_count=3, last_synced=NOW)
+    assert popular.score(weights, NOW) > obscure.score(weights, NOW)
+
+    never_synced = RepositorySignals()
+    synced_today = RepositorySignals(last_synced=NOW)
+    assert never_synced.score(weights, NOW) > synced_today.score(weights, NOW)
+
+    failing = RepositorySignals(failures=3)
+    assert never_synced.score(weights, NOW) > failing.score(weights, NOW)
+    # A signal weighted to zero doesn't count
+    assert failing.score(PriorityWeights(failures=0), NOW) == never_synced.score(weights, NOW)
+
+
+def fork(name: str, days_since_push: int, stars: int = 0) -> SimpleNamespace:
+    pushed_at = datetime.now(timezone.utc) - timedelta(days=days_since_push)
+    return SimpleNamespace(name=name, full_name=f"org/{name}", pushed_at=pushed_at, stargazers_count=stars)
+
+
+def test_forks_are_scored_by_their_upstream():
+    now = datetime.now(timezone.utc)
+    scheduler = RepositoryScheduler(key=fork_key, upstreams={
+        "owner__dormant": UpstreamActivity(pushed_at=now - timedelta(days=200), stargazers_count=10),
+        "owner__active": UpstreamActivity(pushed_at=now - timedelta(days=1), stargazers_count=5000),
+    })
+    # Syncing pushes to the fork, the fork synced yesterday has the dormant upstream
+    scheduler.push(fork("owner__dormant", days_since_push=1))
+    scheduler.push(fork("owner__active", days_since_push=200))
+    scheduler.push(fork("owner__unknown", days_since_push=0, stars=10000))
+    assert [repository.name for repository in scheduler] == ["owner__active", "owner__dormant", "owner__unknown"]
+
+
+def test_upstreams_are_scored_by_themselves():
+    scheduler = RepositoryScheduler(key=upstream_key)
+    scheduler.push(SimpleNamespace(full_name="owner/old", pushed_at=NOW - timedelta(days=400), stargazers_count=0))
+    scheduler.push(SimpleNamespace(full_name="owner/new", pushed_at=datetime.now(timezone.utc), stargazers_count=0))
+    assert [repository.full_name for repository in scheduler] == ["owner/new", "owner/old"]
+
+
+def test_push_while_draining():
+    history = ScheduleHistory()
+    history.record_success("recent")
+    scheduler = RepositoryScheduler(key=fork_key, history=history)
+    scheduler.push(SimpleNamespace(name="first"), score=3)
+    scheduler.push(SimpleNamespace(name="last"), score=1)
+    order = []
+    for repository in scheduler:
+        order.append(repository.name)
+        if repository.name == "first":
+            scheduler.push(SimpleNamespace(name="second"), score=2)
+            scheduler.push(SimpleNamespace(name="tied"), score=1)
+    # Ties keep the order they were pushed in
+    assert order == ["first", "second", "last", "tied"]
+    assert len(scheduler) == 0
+
+
+def test_history_round_trip(tmp_path):
+    path = tmp_path / "history.json"
+    history = ScheduleHistory(path)
+    history.record_failure("name")
+    history.record_failure("name")
+    history.record_success("other", when=NOW)
+    history.save()
+
+    reloaded = ScheduleHistory(path)
+    assert reloaded.failures("name") == 2
+    assert reloaded.last_synced("other") == NOW
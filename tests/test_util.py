@@ -0,0 +1,39 @@
+import io
+import json
+import random
+
+import pytest
+
+from oss_security_assessments.util import fork_repository_name, iter_json_array, upstream_repository_name
+
+
+def test_fork_and_upstream_names():
+    assert fork_repository_name("apache/commons-text") == "apache__commons-text"
+    assert upstream_repository_name("Org/apache__commons-text") == "apache/commons-text"
+    assert upstream_repository_name("apache__commons__text") == "apache/commons__text"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_iter_json_array_across_chunk_boundaries(chunk_size: int):
+    generator = random.Random(0)
+    elements = [
+        0.7215400323407826,
+        12345678901234567890,
+        -3e-7,
+        True,
+        None,
+        'a string, with [brackets] and "quotes"',
+        {"number": 1, "nested": {"list": [1, 2.5, "three"]}},
+        [],
+        *(generator.random() for _ in range(20)),
+    ]
+    text = json.dumps(elements, indent=2)
+    assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == elements
+
+
+def test_iter_json_array_empty_and_invalid():
+    assert list(iter_json_array(io.StringIO("  [ ]  "))) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('{"not": "an array"}')))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO("[1, 2"), chunk_size=2))